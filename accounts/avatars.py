@@ -0,0 +1,56 @@
+"""
+Square-cropping of uploaded avatars, off the request path.
+
+CustomUser.save() only queues process_avatar() when a new file was uploaded
+or a direct upload was claimed, and only once the transaction commits. The job decodes the image once, crops
+it to a centred square when needed, and stores the result with its size, so
+no later save ever reads image bytes.
+"""
+
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from listings.media_gc import tombstone
+
+
+def pending_avatars():
+    """
+    Users with an uploaded avatar but no stored size: the background job was
+    lost (e.g. a worker restart) or failed. manage.py process_avatars retries them.
+    """
+    from .models import CustomUser
+
+    return (
+        CustomUser.objects.filter(avatar_width__isnull=True)
+        .exclude(image="")
+        .exclude(image__in=CustomUser.protected_files)
+    )
+
+
+def process_avatar(user_id, name):
+    from .models import CustomUser
+
+    with default_storage.open(name) as stored:
+        img = Image.open(stored)
+        img.load()
+    width, height = img.size
+    new_name = name
+    if width != height:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        side = min(width, height)
+        img = ImageOps.fit(img, (side, side), method=Image.LANCZOS, centering=(0.5, 0.5))
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG")
+        new_name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        width = height = side
+
+    # Only finish if the user still has this upload; a newer one wins.
+    updated = CustomUser.objects.filter(pk=user_id, image=name).update(
+        image=new_name, avatar_width=width, avatar_height=height
+    )
+    if new_name != name:
+        tombstone([name] if updated else [new_name])
@@ -1,6 +1,8 @@
 from allauth.account.forms import SignupForm
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from mysite.images import clean_uploaded_image
 import re
 User = get_user_model()
 class CustomSignupForm(SignupForm):
@@ -36,6 +38,11 @@ class ProfileEditForm(forms.ModelForm):
             raise forms.ValidationError("Username must contain only letters and digits.")
         return username
 
+    def clean_image(self):
+        return clean_uploaded_image(
+            self.cleaned_data.get('image'), settings.AVATAR_MAX_DIMENSION
+        )
+
 from .models import UserRating
 
 class UserRatingForm(forms.ModelForm):
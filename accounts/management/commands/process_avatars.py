@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from accounts.avatars import pending_avatars, process_avatar
+
+
+class Command(BaseCommand):
+    help = (
+        "Crop uploaded avatars whose background processing never finished "
+        "(no stored size). Run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        pending = pending_avatars().values_list("pk", "image")
+        for user_id, name in pending.iterator(chunk_size=options["batch_size"]):
+            try:
+                process_avatar(user_id, name)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"{name}: {e}")
+            else:
+                processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {processed} avatars, {failed} failed.")
+        )
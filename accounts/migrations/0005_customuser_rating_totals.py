@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-19 10:02
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+from mysite.ratings import bayesian_score
+
+
+def backfill_rating_totals(apps, schema_editor):
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    UserRating = apps.get_model("accounts", "UserRating")
+    totals = UserRating.objects.values("ratee").annotate(
+        total=Sum("rating"), votes=Count("id")
+    )
+    for row in totals:
+        CustomUser.objects.filter(pk=row["ratee"]).update(
+            rating_sum=row["total"],
+            rating_count=row["votes"],
+            rating_score=bayesian_score(row["total"], row["votes"]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_usercomment_liked_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='rating_score',
+            field=models.FloatField(db_index=True, default=3.0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
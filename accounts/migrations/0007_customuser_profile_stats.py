@@ -0,0 +1,56 @@
+# Generated by Django 4.2.20 on 2026-10-19 13:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count_of(queryset, field):
+    counts = queryset.values(field).annotate(n=Count("pk")).values("n")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def backfill_profile_stats(apps, schema_editor):
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    UserComment = apps.get_model("accounts", "UserComment")
+    LoRA = apps.get_model("listings", "LoRA")
+    Model = apps.get_model("listings", "Model")
+    CustomUser.objects.update(
+        lora_count=_count_of(
+            LoRA.objects.filter(librarian_id=OuterRef("pk")), "librarian_id"
+        ),
+        public_model_count=_count_of(
+            Model.objects.filter(creator_id=OuterRef("pk"), model_type="public"),
+            "creator_id",
+        ),
+        comment_count=_count_of(
+            UserComment.objects.filter(profile_id=OuterRef("pk")), "profile_id"
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_usercomment_threading'),
+        ('listings', '0005_comment_threading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='lora_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='public_model_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_profile_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-19 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_customuser_profile_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,13 +1,20 @@
 import os
-from io import BytesIO
-from django.core.files.base import ContentFile
 from django.utils.text import slugify
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from PIL import Image, ImageOps
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from mysite import background
+from mysite.file_tracking import FileTrackingMixin
+from mysite.threads import ThreadedMixin
+
+from mysite.ratings import PRIOR_MEAN, aggregate_update
+
+from .avatars import process_avatar
 
 def profile_image_upload(instance, filename):
     ext = os.path.splitext(filename)[1]
@@ -16,7 +23,7 @@ def profile_image_upload(instance, filename):
     filename = f"{username_slug}_profile_{timestamp}{ext}"
     return os.path.join("profile_pics", filename)
 
-class CustomUser(AbstractUser):
+class CustomUser(FileTrackingMixin, AbstractUser):
     email = models.EmailField(unique=True)
     
     ROLE_CHOICES = (
@@ -30,47 +37,63 @@ class CustomUser(AbstractUser):
         blank=True,
         null=True
     )
-    
+    # Totals of the UserRatings this user has received, kept by UserRating.submit().
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_score = models.FloatField(default=PRIOR_MEAN, db_index=True)
+    # Profile counters, adjusted by adjust_profile_stats() as rows come and go.
+    lora_count = models.PositiveIntegerField(default=0)
+    public_model_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    # Set by accounts.avatars.process_avatar once an upload is processed.
+    avatar_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    avatar_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    # A replaced avatar is deleted after commit (mysite.file_tracking).
+    tracked_file_fields = ("image",)
+    protected_files = ("profile_pics/default_profile.jpg",)
+
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
     def save(self, *args, **kwargs):
-        # If updating an existing user, delete the old image from S3
-        # only if the new image is being set and the old image is not the default.
-        if self.pk:
-            try:
-                old_user = CustomUser.objects.get(pk=self.pk)
-            except CustomUser.DoesNotExist:
-                old_user = None
-            if old_user and old_user.image and self.image:
-                # Compare file names; delete old file only if different and not default.
-                if (old_user.image.name != self.image.name and 
-                    "default_profile.jpg" not in os.path.basename(old_user.image.name)):
-                    old_user.image.delete(save=False)
-        
-        # If a new image is uploaded, crop it to a centered square.
-        if self.image:
-            try:
-                self.image.open()
-                img = Image.open(self.image)
-                # Convert to RGB if necessary.
-                if img.mode != "RGB":
-                    img = img.convert("RGB")
-                # Crop the image if it's not already square.
-                if img.width != img.height:
-                    min_dim = min(img.width, img.height)
-                    img = ImageOps.fit(img, (min_dim, min_dim), method=Image.LANCZOS, centering=(0.5, 0.5))
-                    buffer = BytesIO()
-                    img.save(buffer, format="JPEG")
-                    filebuffer = ContentFile(buffer.getvalue())
-                    # Overwrite the current image with the cropped version.
-                    self.image.save(self.image.name, filebuffer, save=False)
-            except Exception as e:
-                # Optionally log the error.
-                pass
-        
+        # A freshly uploaded file is not committed to storage until super().save();
+        # a direct upload (mysite.direct_uploads) arrives as a new stored name.
+        new_upload = bool(self.image) and not self.image._committed
+        update_fields = kwargs.get("update_fields")
+        changed = (update_fields is None or "image" in update_fields) and (
+            new_upload or self.file_changed("image")
+        )
+        if changed:
+            self.avatar_width = self.avatar_height = None
         super().save(*args, **kwargs)
-    
+        if changed and not self._is_protected(self.image.name):
+            # Crop in the background once the row is committed (accounts.avatars).
+            user_id, name = self.pk, self.image.name
+            transaction.on_commit(
+                lambda: background.submit(process_avatar, user_id, name)
+            )
+
     def __str__(self):
         return self.username
 
+@receiver(post_delete, sender=CustomUser)
+def delete_avatar_of_deleted_user(sender, instance, **kwargs):
+    instance.delete_tracked_files()
+
+
+def adjust_profile_stats(user_id, **deltas):
+    """
+    Add deltas to a user's profile counters in one UPDATE,
+    e.g. adjust_profile_stats(pk, lora_count=1).
+    """
+    if user_id and deltas:
+        CustomUser.objects.filter(pk=user_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
 class UserRating(models.Model):
     rater = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -91,7 +114,41 @@ class UserRating(models.Model):
         unique_together = ("rater", "ratee")
         ordering = ["-created_at"]
 
-class UserComment(models.Model):
+    @classmethod
+    def submit(cls, rater, ratee, value):
+        """
+        Create or change `rater`'s rating of `ratee` and apply the difference
+        to the ratee's stored totals.
+        """
+        with transaction.atomic():
+            previous = (
+                cls.objects.select_for_update()
+                .filter(rater=rater, ratee=ratee)
+                .values_list("rating", flat=True)
+                .first()
+            )
+            if previous is None:
+                cls.objects.create(rater=rater, ratee=ratee, rating=value)
+                delta_sum, delta_count = value, 1
+            else:
+                cls.objects.filter(rater=rater, ratee=ratee).update(rating=value)
+                delta_sum, delta_count = value - previous, 0
+            if delta_sum or delta_count:
+                CustomUser.objects.filter(pk=ratee.pk).update(
+                    **aggregate_update(delta_sum, delta_count)
+                )
+
+
+@receiver(post_delete, sender=UserRating)
+def remove_rating_from_user_totals(sender, instance, origin=None, **kwargs):
+    # Ratings removed by deleting the rated user leave no totals to fix.
+    if isinstance(origin, CustomUser) and origin.pk == instance.ratee_id:
+        return
+    CustomUser.objects.filter(pk=instance.ratee_id).update(
+        **aggregate_update(-instance.rating, -1)
+    )
+
+class UserComment(ThreadedMixin, models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     profile = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="comments")
     comment = models.TextField()
@@ -101,6 +158,11 @@ class UserComment(models.Model):
         related_name="liked_user_comments",
         blank=True
     )
+    # Reply threading, see mysite.threads.
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies"
+    )
+    path = models.CharField(max_length=255, db_index=True, blank=True, default="")
 
     @property
     def like_count(self):
@@ -109,3 +171,14 @@ class UserComment(models.Model):
 
     def __str__(self):
         return f"Comment by {self.user}"
+
+
+@receiver(post_save, sender=UserComment)
+def count_profile_comment(sender, instance, created, **kwargs):
+    if created:
+        adjust_profile_stats(instance.profile_id, comment_count=1)
+
+
+@receiver(post_delete, sender=UserComment)
+def uncount_profile_comment(sender, instance, **kwargs):
+    adjust_profile_stats(instance.profile_id, comment_count=-1)
@@ -1,3 +1,71 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+User = get_user_model()
+
+# Keep tests off S3; run background jobs inline.
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format="PNG")
+    return SimpleUploadedFile("avatar.png", buffer.getvalue(), content_type="image/png")
+
+
+@override_settings(
+    STORAGES=LOCAL_STORAGES,
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    BACKGROUND_TASKS_INLINE=True,
+    MEDIA_SWEEP_ON_COMMIT=False,
+)
+class AvatarProcessingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="avatar", email="avatar@example.com", password="pw"
+        )
+
+    def test_upload_is_cropped_after_commit(self):
+        self.user.image = png(120, 80)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.avatar_width, self.user.avatar_height), (80, 80))
+        with default_storage.open(self.user.image.name) as stored:
+            self.assertEqual(Image.open(stored).size, (80, 80))
+
+    def test_role_switch_does_not_touch_the_avatar(self):
+        self.user.image = png(64, 64)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        user = User.objects.get(pk=self.user.pk)
+        user.role = "librarian"
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(1):
+                user.save(update_fields=["role"])
+        self.assertEqual(callbacks, [])
+
+    def test_lost_job_is_picked_up_by_process_avatars(self):
+        self.user.image = png(90, 60)
+        with self.captureOnCommitCallbacks():
+            self.user.save()  # the queued job is never run
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.avatar_width)
+
+        call_command("process_avatars", stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.avatar_width, self.user.avatar_height), (60, 60))
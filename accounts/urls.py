@@ -3,11 +3,13 @@ from . import views
 
 urlpatterns = [
     path("profile/<str:username>/", views.profile, name="profile"),
+    path("profile/<str:username>/comments/", views.profile_comments, name="profile_comments"),
     path("comment/delete/<int:pk>/", views.user_comment_delete, name="user_comment_delete"),
     path(
         "comment/<int:pk>/like/",
         views.user_like_comment,
         name="user_like_comment"
     ),
+    path("comment/<int:pk>/replies/", views.user_comment_replies, name="user_comment_replies"),
     path("profile_edit/", views.profile_edit, name="profile_edit"),
 ]
\ No newline at end of file
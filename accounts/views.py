@@ -3,37 +3,22 @@ from django.shortcuts import render, redirect
 from .forms import ProfileEditForm
 from django.conf import settings  # if needed for the default image
 from django.contrib import messages
-from django.db.models import Avg, Q
+from django.db.models import Q
 from listings.models import LoRA, Model
+from listings.access import accessible_model_ids
+from listings.comment_feed import CommentFeed, feed_page_response, reply_parent
 from .forms import UserRatingForm, UserProfileCommentForm
 from .models import UserRating
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from .models import UserComment
 from django.http import JsonResponse
-from django.db.models import Count
 import notifications as notify
 from .models import UserComment
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect
 from django.core.exceptions import PermissionDenied
-
-def filter_private_loras(queryset=None):
-    """
-    Returns LoRAs that are NOT in any model with model_type==PRIVATE.
-    """
-    if queryset is None:
-        queryset = LoRA.objects.all()
-    return queryset.exclude(models__model_type=Model.PRIVATE).distinct()
-
-
-def filter_public_loras(queryset=None):
-    """
-    Returns LoRAs that are NOT in any model with model_type==PUBLIC.
-    """
-    if queryset is None:
-        queryset = LoRA.objects.all()
-    return queryset.exclude(models__model_type=Model.PUBLIC).distinct()
+from mysite.direct_uploads import claim_uploads
 
 @login_required
 def profile_edit(request):
@@ -44,6 +29,8 @@ def profile_edit(request):
             # Check for the "clear" action or empty file
             if 'image-clear' in request.POST:
                 profile.image = 'profile_pics/default_profile.jpg'
+            for key in claim_uploads(request, "avatar", "uploaded_image")[:1]:
+                profile.image = key
             profile.save()
             return redirect('profile', request.user)  # Adjust redirect as needed
     else:
@@ -53,49 +40,45 @@ def profile_edit(request):
 def profile(request, username):
     User = get_user_model()
     profile_user = get_object_or_404(User, username=username)
-    lora_no_models = filter_private_loras(LoRA.objects.filter(librarian=profile_user))
-    lora_no_models = lora_no_models.annotate(model_count=Count('models')).filter(model_count=0)
-    # 1) Accessible LoRAs based on role:
+    is_librarian = getattr(request.user, "role", None) == "librarian"
+    # 1) Accessible LoRAs based on role, from the stored in_*_model flags:
+    # "in a public model or in no model at all" is simply "not in a private model".
     loras = LoRA.objects.filter(librarian=profile_user)
-    if request.user.role != "librarian":
+    if not is_librarian:
+        visible = Q(in_public_model=True) | Q(in_private_model=False)
         if request.user.is_authenticated:
-            # patrons see LoRAs that are checked in,
-            # in public models, in models they can access, or have no models
-            loras = loras.filter(
-                Q(models__model_type=Model.PUBLIC) |
-                Q(models__allowed_users=request.user) |
-                Q(status=LoRA.CHECKED_IN) |
-                Q(pk__in=lora_no_models.values_list('pk', flat=True))
-            ).distinct()
-        else:
-            # anonymous sees only checked‑in LoRAs or those with no models
-            public = loras.filter(models__model_type=Model.PUBLIC)
-            loras = (public | lora_no_models).distinct()
+            # patrons also see LoRAs that are checked in or in models they can access
+            visible |= Q(status=LoRA.CHECKED_IN)
+            model_ids = accessible_model_ids(request.user)
+            if model_ids:
+                visible |= Q(
+                    pk__in=Model.loras.through.objects.filter(
+                        model_id__in=model_ids
+                    ).values("lora_id")
+                )
+        loras = loras.filter(visible)
 
     # 2) Accessible Models based on role:
     models = Model.objects.filter(creator=profile_user)
-    if request.user.role != "librarian":
+    if not is_librarian:
         if request.user.is_authenticated:
             models = models.filter(
                 Q(model_type=Model.PUBLIC) |
-                Q(allowed_users=request.user)
-            ).distinct()
+                Q(pk__in=accessible_model_ids(request.user))
+            )
         else:
             models = models.filter(model_type=Model.PUBLIC)
 
-    ratings_qs = UserRating.objects.filter(ratee=profile_user)
-    avg_rating = ratings_qs.aggregate(avg=Avg("rating"))["avg"] or 0
+    loras = loras.prefetch_related("images")
+    if request.GET.get("sort") == "top":
+        loras = loras.order_by("-rating_score", "-created_at")
+
+    avg_rating = profile_user.average_rating
 
     if request.method == "POST" and "rating" in request.POST:
         form = UserRatingForm(request.POST)
         if form.is_valid():
-            UserRating.objects.update_or_create(
-                rater=request.user,
-                ratee=profile_user,
-                defaults={"rating": form.cleaned_data["rating"]}
-            )
-            # Recalculate after saving
-            avg_rating = UserRating.objects.filter(ratee=profile_user).aggregate(avg=Avg("rating"))["avg"] or 0
+            UserRating.submit(request.user, profile_user, form.cleaned_data["rating"])
             messages.success(request, "Your rating has been submitted.")
             return redirect("profile", username=profile_user.username)
     else:
@@ -109,22 +92,45 @@ def profile(request, username):
             comment = comment_form.save(commit=False)
             comment.user = request.user
             comment.profile = profile_user  # Add a ForeignKey to profile in your Comment model if needed
+            comment.parent = reply_parent(request, UserComment.objects.filter(profile=profile_user))
             comment.save()
             messages.success(request, "Comment added.")
             return redirect("profile", username=profile_user.username)
 
-    comments = UserComment.objects.filter(profile=profile_user).order_by("-created_at")  # if you add profile FK
+    comments = CommentFeed(UserComment.objects.filter(profile=profile_user), request.user)
 
     return render(request, "profile.html", {
         "profile_user": profile_user,
         "loras": loras,
         "models": models,
         "avg_rating": avg_rating,
+        "sort": request.GET.get("sort", ""),
         "form": form,
         "comment_form": comment_form,
         "comments": comments,
     })
 
+def profile_comments(request, username):
+    """Next page of a profile's comments for the "Load more" button."""
+    profile_user = get_object_or_404(get_user_model(), username=username)
+    try:
+        comments = CommentFeed(
+            UserComment.objects.filter(profile=profile_user),
+            request.user,
+            request.GET.get("cursor"),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return feed_page_response(
+        request, "profile_comment_rows.html", {"comments": comments}
+    )
+
+def user_comment_replies(request, pk):
+    """Every reply under a top-level profile comment, for "View replies"."""
+    root = get_object_or_404(UserComment, pk=pk)
+    comments = CommentFeed.replies_to(root, request.user)
+    return feed_page_response(request, "profile_comment_rows.html", {"comments": comments})
+
 @login_required
 def user_comment_delete(request, pk):
     comment = get_object_or_404(UserComment, pk=pk)
@@ -1,7 +0,0 @@
-from django.apps import AppConfig
-
-class ListingsConfig(AppConfig):
-    name = 'listings'
-
-    def ready(self):
-        import listings.signals  # noqa
\ No newline at end of file
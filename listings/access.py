@@ -0,0 +1,61 @@
+"""
+Who may open which private model.
+
+accessible_model_ids() loads the ids of the private models a user was granted
+(Model.allowed_users) once and keeps them in the cache, so can_view() is a set
+lookup instead of loading every allowed user of the model. The cached set is
+dropped once a change to allowed_users for that user commits.
+
+With a shared cache (CACHE_URL) that reaches every worker at once. With the
+default per-process cache other workers only see the change when their copy
+expires, so sets are kept for ACL_CACHE_TIMEOUT seconds only.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+
+ACL_CACHE_TIMEOUT = 60
+
+
+def _cache_key(user_id):
+    return f"acl:models:{user_id}"
+
+
+def accessible_model_ids(user):
+    """
+    Frozenset of the model ids `user` is listed in allowed_users for.
+    Memoized on the user object so one request does at most one cache read.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, "_accessible_model_ids", None)
+    if ids is None:
+        key = _cache_key(user.pk)
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(user.accessible_models.values_list("pk", flat=True))
+            cache.set(key, ids, timeout=ACL_CACHE_TIMEOUT)
+        user._accessible_model_ids = ids
+    return ids
+
+
+def forget_accessible_models(user_ids):
+    # After commit, so a concurrent request cannot cache the old set again.
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def can_view(user, model):
+    """
+    Whether `user` may see the details of `model`: public models, superusers,
+    librarians, the creator and users in allowed_users.
+    """
+    if not model.is_private:
+        return True
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser or getattr(user, "role", "") == "librarian":
+        return True
+    if model.creator_id == user.pk:
+        return True
+    return model.pk in accessible_model_ids(user)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Model, Comment, LoRA, LoRAImage, LoRARating
+from .models import Model, Comment, FileTombstone, LoRA, LoRAImage, LoRARating
 
 
 class LoRAImageInline(admin.TabularInline):
@@ -95,3 +95,11 @@ class LoRARatingAdmin(admin.ModelAdmin):
     list_filter = ("rating", "created_at")
     search_fields = ("lora__title", "user__username")
     readonly_fields = ("created_at",)
+
+
+@admin.register(FileTombstone)
+class FileTombstoneAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at", "attempts", "leased_until")
+    list_filter = ("attempts",)
+    search_fields = ("name",)
+    readonly_fields = ("name", "created_at", "attempts", "last_error")
@@ -0,0 +1,143 @@
+"""
+One page of a comment thread, ready to render.
+
+Used for LoRA, Model and profile comments. A page joins the authors, annotates
+like counts and loads which of its comments the viewer liked, so rendering it
+costs a fixed number of queries. Pages are keyed by an opaque cursor
+(created_at, pk of the last comment shown) rather than an offset, so "load
+more" stays cheap and stable while new comments arrive.
+
+Feeds list top-level comments; CommentFeed.replies_to() loads a whole reply
+subtree with one prefix query on the materialized path (mysite.threads).
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+
+from mysite.threads import STEP
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(comment):
+    raw = f"{comment.created_at.isoformat()}|{comment.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(). Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (UnicodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def _with_rows_data(queryset):
+    return queryset.select_related("user").annotate(
+        num_likes=Count("liked_by", distinct=True)
+    )
+
+
+def _reply_counts(model, roots):
+    """
+    {root path: replies in its whole subtree} for top-level `roots`, as one
+    grouped query. Each root is an indexed prefix match on path; the root a
+    reply belongs to is the first segment of its path.
+    """
+    matches = Q()
+    for root in roots:
+        if root.path:
+            matches |= Q(path__startswith=root.path)
+    if not matches:
+        return {}
+    counts = (
+        model.objects.filter(matches, parent__isnull=False)
+        .annotate(root=Substr("path", 1, STEP))
+        .values("root")
+        .annotate(n=Count("pk"))
+        .order_by()
+    )
+    return {row["root"]: row["n"] for row in counts}
+
+
+class CommentFeed:
+    """
+    Newest-first page of the top-level comments in `queryset` (Comment or
+    UserComment rows) after `cursor`. Exposes `comments`, `liked_ids` and
+    `next_cursor` (None on the last page).
+    """
+
+    def __init__(self, queryset, user, cursor=None, page_size=PAGE_SIZE):
+        queryset = _with_rows_data(queryset.filter(parent__isnull=True)).order_by(
+            "-created_at", "-pk"
+        )
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+
+        rows = list(queryset[: page_size + 1])
+        self.next_cursor = (
+            encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        )
+        rows = rows[:page_size]
+        # num_replies counts the whole subtree, which is what "View replies" loads.
+        reply_counts = _reply_counts(queryset.model, rows)
+        for comment in rows:
+            comment.num_replies = reply_counts.get(comment.path, 0)
+        self._set_rows(rows, queryset.model, user)
+
+    @classmethod
+    def replies_to(cls, root, user):
+        """Every reply under `root` in thread order, as a single page."""
+        feed = cls.__new__(cls)
+        feed.next_cursor = None
+        rows = list(_with_rows_data(root.descendants()).order_by("path"))
+        feed._set_rows(rows, type(root), user)
+        return feed
+
+    def _set_rows(self, rows, model, user):
+        self.comments = rows
+        self.liked_ids = frozenset()
+        if rows and user.is_authenticated:
+            self.liked_ids = frozenset(
+                model.objects.filter(
+                    pk__in=[c.pk for c in rows], liked_by=user
+                ).values_list("pk", flat=True)
+            )
+
+    def __iter__(self):
+        return iter(self.comments)
+
+    def __len__(self):
+        return len(self.comments)
+
+
+def feed_page_response(request, template_name, context):
+    """
+    JSON for a "load more" request: the rendered rows of context["comments"]
+    and the cursor for the page after them.
+    """
+    html = render_to_string(template_name, context, request=request)
+    return JsonResponse({"html": html, "next_cursor": context["comments"].next_cursor})
+
+
+def reply_parent(request, queryset):
+    """
+    The comment a posted reply answers (the "parent" field), looked up within
+    `queryset` so replies cannot be attached to another thread. None for a
+    top-level comment.
+    """
+    parent_id = request.POST.get("parent")
+    if not parent_id:
+        return None
+    return get_object_or_404(queryset, pk=parent_id)
@@ -1,22 +1,25 @@
 from django import forms
+from django.conf import settings
+from mysite.images import clean_uploaded_image
+from mysite.versioning import VersionedFormMixin
 from .models import LoRA, Model, Comment
 from django.contrib.auth import get_user_model
 import logging
 logger = logging.getLogger(__name__)
 User = get_user_model()
-class LoRAForm(forms.ModelForm):
+class LoRAForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = LoRA
-        fields = ['title', 'description', 'location']
+        fields = ['title', 'description', 'location', 'version']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4, 'placeholder': "Enter LoRA description..."})
         }
 
-class ModelForm(forms.ModelForm):
+class ModelForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = Model
         # Include model_type by default (librarians can choose)
-        fields = ['title', 'description', 'model_type', 'image']
+        fields = ['title', 'description', 'model_type', 'image', 'version']
 
     def __init__(self, *args, **kwargs):
         self.request = kwargs.pop('request', None)
@@ -28,14 +31,21 @@ class ModelForm(forms.ModelForm):
             if role == 'patron':
                 self.fields.pop('model_type', None)
 
+    def clean_image(self):
+        return clean_uploaded_image(
+            self.cleaned_data.get('image'), settings.IMAGE_MAX_DIMENSION
+        )
+
     def save(self, commit=True):
         # Create instance without saving
         instance = super().save(commit=False)
         # For patrons, ensure the model type is public.
+        extra_fields = ()
         if self.request and getattr(self.request.user, 'role', '').strip().lower() == 'patron':
             instance.model_type = Model.PUBLIC
+            extra_fields = ('model_type',)
         if commit:
-            instance.save()
+            self.save_instance(instance, extra_fields)
             self.save_m2m()
         return instance
 
@@ -48,10 +58,10 @@ class CommentForm(forms.ModelForm):
             'comment': forms.Textarea(attrs={'rows': 3, 'placeholder': "Enter your comment here..."})
         }
 
-class LoRAStatusForm(forms.ModelForm):
+class LoRAStatusForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = LoRA
-        fields = ['status']
+        fields = ['status', 'version']
 
 
 class BorrowLoRAForm(forms.Form):
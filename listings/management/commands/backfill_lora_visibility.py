@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from listings.models import LoRA, refresh_lora_visibility
+
+
+class Command(BaseCommand):
+    help = "Recompute the in_private_model / in_public_model flags on every LoRA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ids = list(LoRA.objects.order_by("pk").values_list("pk", flat=True))
+        for start in range(0, len(ids), batch_size):
+            refresh_lora_visibility(ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed visibility for {len(ids)} LoRAs."))
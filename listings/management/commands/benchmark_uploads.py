@@ -0,0 +1,81 @@
+import random
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from listings.models import LoRA, LoRAImage
+from listings.uploads import store_files
+
+
+class SlowStorage(FileSystemStorage):
+    """A local storage whose writes take as long as `delays[name]` says."""
+
+    def __init__(self, delays, **kwargs):
+        super().__init__(**kwargs)
+        self.delays = delays
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _save(self, name, content):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.delays[content.name])
+            return super()._save(name, content)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare writing one multi-image upload to a slow storage serially "
+        "(one LoRAImage at a time) vs through listings.uploads.store_files()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=10)
+        parser.add_argument("--delay", type=float, default=0.5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        n, delay = options["files"], options["delay"]
+        rng = random.Random(options["seed"])
+        # Spread the latencies so "slowest file" and "sum" are far apart.
+        delays = {f"image_{i}.png": delay * rng.uniform(0.2, 1.0) for i in range(n)}
+        lora = LoRA(title="benchmark")
+
+        buffer = BytesIO()
+        Image.new("RGB", (64, 64), "red").save(buffer, format="PNG")
+
+        def batch():
+            files = [ContentFile(buffer.getvalue(), name=name) for name in delays]
+            return [LoRAImage(lora=lora) for _ in files], files
+
+        with tempfile.TemporaryDirectory() as root:
+            storage = SlowStorage(delays, location=root)
+            started = time.monotonic()
+            store_files(*batch(), storage=storage, workers=1)
+            serial_elapsed = time.monotonic() - started
+
+            storage.peak = 0
+            started = time.monotonic()
+            store_files(*batch(), storage=storage)
+            parallel_elapsed, parallel_peak = time.monotonic() - started, storage.peak
+
+        self.stdout.write(
+            f"{n} files, slowest {max(delays.values()):.2f}s, "
+            f"sum {sum(delays.values()):.2f}s"
+        )
+        self.stdout.write(f"serial:   {serial_elapsed:7.2f}s wall")
+        self.stdout.write(
+            f"parallel: {parallel_elapsed:7.2f}s wall, peak {parallel_peak} concurrent writes"
+        )
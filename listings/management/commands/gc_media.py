@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from listings.media_gc import gc_media, sweep_tombstones
+
+
+class Command(BaseCommand):
+    help = "Find uploaded files no row references any more and delete them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=int,
+            default=24,
+            help="Leave files younger than this alone; their rows may still be in flight.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="List the orphans without deleting them."
+        )
+
+    def handle(self, *args, **options):
+        orphans = gc_media(
+            grace=timedelta(hours=options["grace_hours"]), dry_run=options["dry_run"]
+        )
+        if options["dry_run"]:
+            for name in orphans:
+                self.stdout.write(name)
+            self.stdout.write(self.style.SUCCESS(f"{len(orphans)} orphaned files."))
+            return
+        deleted = sweep_tombstones()
+        self.stdout.write(
+            self.style.SUCCESS(f"Tombstoned {len(orphans)} orphaned files, deleted {deleted}.")
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from mysite import http_client
+
+
+class SlowUpstream:
+    """A local HTTP server that answers every request after a fixed delay."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with upstream._lock:
+                    upstream.in_flight += 1
+                    upstream.peak = max(upstream.peak, upstream.in_flight)
+                time.sleep(upstream.delay)
+                with upstream._lock:
+                    upstream.in_flight -= 1
+                body = b'{"generated_text": "ok"}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self):
+        self.peak = 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare how many slow upstream calls one process holds at once: "
+        "the sync client (one per gunicorn sync worker) vs the async client "
+        "(many per uvicorn worker)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--delay", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        n, delay = options["requests"], options["delay"]
+        timeout = (3.05, delay + 10)
+
+        with SlowUpstream(delay) as upstream:
+            # A sync worker serves one request at a time, so its calls are serial.
+            started = time.monotonic()
+            for _ in range(n):
+                http_client.get(upstream.url, timeout=timeout, retries=0)
+            sync_elapsed, sync_peak = time.monotonic() - started, upstream.peak
+
+            upstream.reset()
+
+            async def burst():
+                await asyncio.gather(
+                    *(
+                        http_client.async_get(upstream.url, timeout=timeout, retries=0)
+                        for _ in range(n)
+                    )
+                )
+
+            started = time.monotonic()
+            asyncio.run(burst())
+            async_elapsed, async_peak = time.monotonic() - started, upstream.peak
+
+        self.stdout.write(f"{n} upstream calls, {delay:.2f}s each")
+        self.stdout.write(
+            f"sync:  {sync_elapsed:7.2f}s wall, peak {sync_peak} concurrent per process"
+        )
+        self.stdout.write(
+            f"async: {async_elapsed:7.2f}s wall, peak {async_peak} concurrent per process"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from listings.models import LoRA, Model, refresh_lora_cards, refresh_model_cards
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored card summaries (image, like and LoRA counts) for every LoRA and Model."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        for model, refresh in ((LoRA, refresh_lora_cards), (Model, refresh_model_cards)):
+            ids = list(model.objects.order_by("pk").values_list("pk", flat=True))
+            for start in range(0, len(ids), batch_size):
+                refresh(ids[start:start + batch_size])
+            self.stdout.write(
+                self.style.SUCCESS(f"Refreshed {len(ids)} {model._meta.verbose_name_plural}.")
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from listings.media_gc import S3_BATCH_SIZE, sweep_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete the stored files recorded in FileTombstone, in batched storage calls. Run periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=S3_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = sweep_tombstones(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} files."))
@@ -0,0 +1,214 @@
+"""
+Deferred deletion of uploaded files.
+
+Nothing deletes from storage inside a request. Code that orphans a file
+records a FileTombstone in the same transaction (mysite.file_tracking), so a
+rollback also drops the tombstone. After commit a background sweep, and the
+sweep_media command as a periodic fallback, deletes the recorded keys in
+batches: one S3 DeleteObjects call per 1,000 keys, or one delete() per file
+on other storages such as the local FileSystemStorage.
+
+gc_media() is the mark-and-sweep backstop: it lists the upload prefixes in
+storage, subtracts every name still referenced by a FileField, and
+tombstones what is left.
+"""
+
+import threading
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
+
+from mysite import background
+
+S3_BATCH_SIZE = 1000  # DeleteObjects limit
+MAX_ATTEMPTS = 5  # tombstones failing this often are left for inspection
+SWEEP_LEASE = timedelta(minutes=10)  # how long a sweep owns the tombstones it took
+MEDIA_PREFIXES = ("items/", "collections/", "profile_pics/")
+PROTECTED_FILES = frozenset(
+    {
+        "items/default_item_image.png",
+        "collections/default_collection_image.jpg",
+        "profile_pics/default_profile.jpg",
+    }
+)
+
+_sweep_queued = threading.Event()
+
+
+def _tombstones():
+    return apps.get_model("listings", "FileTombstone").objects
+
+
+def tombstone(names):
+    """Record files to delete once the current transaction commits."""
+    names = [name for name in names if name and name not in PROTECTED_FILES]
+    if not names:
+        return
+    model = apps.get_model("listings", "FileTombstone")
+    model.objects.bulk_create(
+        [model(name=name) for name in names], ignore_conflicts=True
+    )
+    transaction.on_commit(request_sweep)
+
+
+def request_sweep():
+    """Run sweep_tombstones() on the background worker, once per burst."""
+    if not getattr(settings, "MEDIA_SWEEP_ON_COMMIT", True):
+        return
+    if not _sweep_queued.is_set():
+        _sweep_queued.set()
+        background.submit(_background_sweep)
+
+
+def _background_sweep():
+    # Anything this run misses is retried by the next sweep or sweep_media.
+    _sweep_queued.clear()
+    sweep_tombstones()
+
+
+def delete_keys(names, storage=None):
+    """
+    Delete `names` from storage. Returns {name: error} for the ones that
+    failed. S3 storages get one DeleteObjects call per S3_BATCH_SIZE keys.
+    """
+    storage = storage or default_storage
+    failed = {}
+    bucket = getattr(storage, "bucket", None)
+    if bucket is None:
+        for name in names:
+            try:
+                storage.delete(name)
+            except OSError as e:
+                failed[name] = str(e)
+        return failed
+
+    for start in range(0, len(names), S3_BATCH_SIZE):
+        chunk = names[start : start + S3_BATCH_SIZE]
+        keys = {storage._normalize_name(name): name for name in chunk}
+        response = bucket.delete_objects(
+            Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+        )
+        for error in response.get("Errors", []):
+            failed[keys.get(error["Key"], error["Key"])] = error.get("Message", "")
+    return failed
+
+
+def _file_fields():
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def referenced_names(names=None):
+    """
+    Stored names referenced by any FileField, limited to `names` if given.
+    One query per file field.
+    """
+    found = set()
+    for model, field in _file_fields():
+        rows = model._default_manager.exclude(**{field.name: ""})
+        if names is not None:
+            rows = rows.filter(**{f"{field.name}__in": names})
+        found.update(rows.values_list(field.name, flat=True).iterator())
+    return found
+
+
+def _claim_tombstones(batch_size):
+    """
+    Lease up to `batch_size` tombstones to this sweep in one short
+    transaction, so no row lock is held while storage is called.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            _tombstones()
+            .select_for_update(skip_locked=True)
+            .filter(attempts__lt=MAX_ATTEMPTS)
+            .filter(models.Q(leased_until__isnull=True) | models.Q(leased_until__lt=now))
+            .order_by("pk")[:batch_size]
+        )
+        _tombstones().filter(pk__in=[t.pk for t in batch]).update(
+            leased_until=now + SWEEP_LEASE
+        )
+    return batch
+
+
+def sweep_tombstones(batch_size=S3_BATCH_SIZE, storage=None):
+    """
+    Delete the files of up to `batch_size` tombstones per round until none
+    are left. Returns how many files were deleted.
+
+    Each round leases its batch and commits, deletes the files with no
+    transaction open, then records the outcome. Failed tombstones keep
+    their lease, so they are retried by a later sweep rather than this one.
+    """
+    deleted = 0
+    while True:
+        batch = _claim_tombstones(batch_size)
+        if not batch:
+            return deleted
+        names = [t.name for t in batch]
+        # A name can be referenced again (e.g. restored); keep those files.
+        keep = referenced_names(names)
+        failed = delete_keys([n for n in names if n not in keep], storage)
+
+        with transaction.atomic():
+            _tombstones().filter(
+                pk__in=[t.pk for t in batch if t.name not in failed]
+            ).delete()
+            for t in batch:
+                if t.name in failed:
+                    t.attempts += 1
+                    t.last_error = failed[t.name][:1000]
+            _tombstones().bulk_update(
+                [t for t in batch if t.name in failed], ["attempts", "last_error"]
+            )
+        deleted += len(batch) - len(failed) - len(keep)
+        if len(batch) < batch_size:
+            return deleted
+
+
+def list_media(prefix, storage=None):
+    """Yield (name, modified time) for every file under `prefix`."""
+    storage = storage or default_storage
+    bucket = getattr(storage, "bucket", None)
+    if bucket is not None:
+        location = storage._normalize_name("")
+        for obj in bucket.objects.filter(Prefix=storage._normalize_name(prefix)):
+            yield obj.key[len(location):].lstrip("/"), obj.last_modified
+        return
+
+    if not storage.exists(prefix):
+        return
+    directories, files = storage.listdir(prefix)
+    for filename in files:
+        name = f"{prefix}{filename}"
+        yield name, storage.get_modified_time(name)
+    for directory in directories:
+        yield from list_media(f"{prefix}{directory}/", storage)
+
+
+def gc_media(grace=timedelta(hours=24), dry_run=False, storage=None):
+    """
+    Tombstone stored files that no row references. Files younger than
+    `grace` are skipped, since their row may not be committed yet.
+    Returns the orphaned names.
+    """
+    cutoff = timezone.now() - grace
+    candidates = [
+        name
+        for prefix in MEDIA_PREFIXES
+        for name, modified in list_media(prefix, storage)
+        if modified < cutoff and name not in PROTECTED_FILES
+    ]
+    referenced = referenced_names()
+    orphans = [name for name in candidates if name not in referenced]
+    if orphans and not dry_run:
+        with transaction.atomic():
+            tombstone(orphans)
+    return orphans
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-19 10:02
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+from mysite.ratings import bayesian_score
+
+
+def backfill_rating_totals(apps, schema_editor):
+    LoRA = apps.get_model("listings", "LoRA")
+    LoRARating = apps.get_model("listings", "LoRARating")
+    totals = LoRARating.objects.values("lora").annotate(
+        total=Sum("rating"), votes=Count("id")
+    )
+    for row in totals:
+        LoRA.objects.filter(pk=row["lora"]).update(
+            rating_sum=row["total"],
+            rating_count=row["votes"],
+            rating_score=bayesian_score(row["total"], row["votes"]),
+            rating=round(row["total"] / row["votes"], 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lora',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lora',
+            name='rating_score',
+            field=models.FloatField(db_index=True, default=3.0),
+        ),
+        migrations.AddField(
+            model_name='lora',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-19 11:40
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_visibility(apps, schema_editor):
+    LoRA = apps.get_model("listings", "LoRA")
+    Model = apps.get_model("listings", "Model")
+    memberships = Model.loras.through.objects.filter(lora_id=OuterRef("pk"))
+    LoRA.objects.update(
+        in_private_model=Exists(memberships.filter(model__model_type="private")),
+        in_public_model=Exists(memberships.filter(model__model_type="public")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_lora_rating_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lora',
+            name='in_private_model',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='lora',
+            name='in_public_model',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_visibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count_of(queryset, field):
+    counts = queryset.values(field).annotate(n=Count("pk")).values("n")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def backfill_card_summaries(apps, schema_editor):
+    LoRA = apps.get_model("listings", "LoRA")
+    LoRAImage = apps.get_model("listings", "LoRAImage")
+    Model = apps.get_model("listings", "Model")
+    images = LoRAImage.objects.filter(lora_id=OuterRef("pk"))
+    LoRA.objects.update(
+        image_count=_count_of(images, "lora_id"),
+        cover_image=Coalesce(
+            Subquery(images.order_by("pk").values("image")[:1]), Value("")
+        ),
+        likes_total=_count_of(
+            LoRA.liked_by.through.objects.filter(lora_id=OuterRef("pk")), "lora_id"
+        ),
+    )
+    Model.objects.update(
+        likes_total=_count_of(
+            Model.liked_by.through.objects.filter(model_id=OuterRef("pk")), "model_id"
+        ),
+        lora_count=_count_of(
+            Model.loras.through.objects.filter(model_id=OuterRef("pk")), "model_id"
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_lora_visibility_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lora',
+            name='image_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lora',
+            name='cover_image',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='lora',
+            name='likes_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='model',
+            name='likes_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='model',
+            name='lora_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_card_summaries, migrations.RunPython.noop),
+    ]
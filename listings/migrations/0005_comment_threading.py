@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-19 13:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def backfill_paths(apps, schema_editor):
+    # Every existing comment becomes the root of its own thread.
+    Comment = apps.get_model("listings", "Comment")
+    Comment.objects.filter(path="").update(
+        path=Concat(LPad(Cast("pk", CharField()), 10, Value("0")), Value("/"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_card_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='listings.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
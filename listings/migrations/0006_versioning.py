@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_comment_threading'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lora',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='model',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_filetombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filetombstone',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -4,12 +4,23 @@ import uuid
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models.signals import m2m_changed
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Count, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import slugify
 
+from accounts.models import adjust_profile_stats
+from mysite.file_tracking import FileTrackingMixin
+from mysite.ratings import PRIOR_MEAN, aggregate_update
+from mysite.threads import ThreadedMixin
+from mysite.versioning import VersionedMixin
+
+from .access import forget_accessible_models
+
 User = get_user_model()
 
 
@@ -33,7 +44,7 @@ def generate_identifier():
     return str(uuid.uuid4())[:8]
 
 
-class LoRA(models.Model):
+class LoRA(VersionedMixin, models.Model):
     # Define status constants
     CHECKED_IN = "checked_in"
     IN_CIRCULATION = "in_circulation"
@@ -56,6 +67,17 @@ class LoRA(models.Model):
     description = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
+    # Running totals kept by LoRARating.submit(); rating_score backs "top rated" sorts.
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_score = models.FloatField(default=PRIOR_MEAN, db_index=True)
+    # Denormalized membership flags, kept in sync by refresh_lora_visibility().
+    in_private_model = models.BooleanField(default=False, db_index=True)
+    in_public_model = models.BooleanField(default=False, db_index=True)
+    # Card summary kept by refresh_lora_cards(), so list pages need no per-card queries.
+    image_count = models.PositiveIntegerField(default=0)
+    cover_image = models.CharField(max_length=255, blank=True, default="")
+    likes_total = models.PositiveIntegerField(default=0)
     librarian = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="loras"
     )
@@ -63,29 +85,29 @@ class LoRA(models.Model):
         settings.AUTH_USER_MODEL, blank=True, related_name="liked_loras"
     )
     views = models.PositiveIntegerField(default=0)
+    # Bumped by every save(); see mysite.versioning.
+    version = models.PositiveIntegerField(default=0)
 
     def like_count(self):
         return self.liked_by.count()
 
+    @property
+    def cover_url(self):
+        return default_storage.url(self.cover_image) if self.cover_image else ""
+
     def __str__(self):
         return self.title
 
 
-class LoRAImage(models.Model):
+class LoRAImage(FileTrackingMixin, models.Model):
     lora = models.ForeignKey(LoRA, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(
         upload_to=lora_image_upload, default="items/default_item_image.png"
     )
 
-    def delete(self, *args, **kwargs):
-        # Delete file from storage unless it is the default.
-        if (
-            self.image
-            and "default_item_image.png"
-            not in os.path.basename(self.image.name).lower()
-        ):
-            self.image.delete(save=False)
-        super().delete(*args, **kwargs)
+    # Replaced and deleted files are removed after commit (mysite.file_tracking).
+    tracked_file_fields = ("image",)
+    protected_files = ("items/default_item_image.png",)
 
     def save(self, *args, **kwargs):
         # Save the instance without performing cropping.
@@ -97,20 +119,31 @@ class LoRAImage(models.Model):
             and "default_item_image.png"
             not in os.path.basename(self.image.name).lower()
         ):
-            defaults = LoRAImage.objects.filter(
+            # The placeholder file is shared, so only the rows go.
+            LoRAImage.objects.filter(
                 lora=self.lora, image__icontains="default_item_image.png"
-            )
-            for default_obj in defaults:
-                if default_obj.image:
-                    default_obj.image.delete(save=False)
-                default_obj.delete()
+            ).delete()
 
     def __str__(self):
         return f"Image for {self.lora.title}"
 
 
+class FileTombstone(models.Model):
+    """A stored file to delete once the transaction that orphaned it commits."""
+
+    name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    # Set while a sweep deletes the file; an expired lease is picked up again.
+    leased_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
 # --- Model Model ---
-class Model(models.Model):
+class Model(FileTrackingMixin, VersionedMixin, models.Model):
     PUBLIC = "public"
     PRIVATE = "private"
     MODEL_TYPE_CHOICES = [
@@ -141,17 +174,18 @@ class Model(models.Model):
     liked_by = models.ManyToManyField(
         settings.AUTH_USER_MODEL, related_name="liked_models", blank=True
     )
+    # Card summary kept by refresh_model_cards().
+    likes_total = models.PositiveIntegerField(default=0)
+    lora_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=0)
+
+    tracked_file_fields = ("image",)
+    protected_files = ("collections/default_collection_image.jpg",)
 
     def like_count(self):
         return self.liked_by.count()
 
-    @property
-    def comments(self):
-        from .models import Comment  # Import here to avoid circular import
-
-        return Comment.objects.filter(model=self).order_by("-created_at")
-
     def __str__(self):
         return self.title
 
@@ -159,6 +193,13 @@ class Model(models.Model):
     def is_private(self):
         return self.model_type == self.PRIVATE
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored type so a post_save can tell whether it changed.
+        instance._loaded_model_type = instance.__dict__.get("model_type")
+        return instance
+
     def save(self, *args, **kwargs):
         # If image is None or an empty string, set it to default.
         if not self.image:
@@ -167,7 +208,7 @@ class Model(models.Model):
 
 
 # --- Comment Model ---
-class Comment(models.Model):
+class Comment(ThreadedMixin, models.Model):
     lora = models.ForeignKey(
         LoRA, on_delete=models.CASCADE, null=True, blank=True, related_name="comments"
     )
@@ -184,6 +225,11 @@ class Comment(models.Model):
     liked_by = models.ManyToManyField(
         settings.AUTH_USER_MODEL, related_name="liked_comments", blank=True
     )
+    # Reply threading, see mysite.threads.
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies"
+    )
+    path = models.CharField(max_length=255, db_index=True, blank=True, default="")
 
     def like_count(self):
         return self.liked_by.count()
@@ -195,29 +241,225 @@ class Comment(models.Model):
 # --- Enforce Private Model Constraint ---
 # When loras are added to a model, if the model is private,
 # the lora must not belong to any other model.
+# The whole pk_set is checked with one indexed query on in_private_model.
 @receiver(m2m_changed, sender=Model.loras.through)
 def enforce_private_model_constraint(
     sender, instance, action, reverse, model, pk_set, **kwargs
 ):
-    if action == "pre_add":
+    if action != "pre_add" or not pk_set:
+        return
+    if reverse:
+        # lora.models.add(...): instance is the LoRA being placed in more models.
+        if LoRA.objects.filter(pk=instance.pk, in_private_model=True).exists():
+            raise ValidationError(
+                f"LoRA with pk {instance.pk} is in a private model and cannot be added to another model."
+            )
+        return
+    conflicts = sorted(
+        model.objects.filter(pk__in=pk_set, in_private_model=True).values_list(
+            "pk", flat=True
+        )
+    )
+    if conflicts:
+        pks = ", ".join(str(pk) for pk in conflicts)
         if instance.model_type == Model.PRIVATE:
-            for lora_pk in pk_set:
-                conflicts = model.objects.filter(
-                    pk=lora_pk, models__model_type=Model.PRIVATE
-                ).exclude(models=instance)
-                if conflicts.exists():
-                    raise ValidationError(
-                        f"LoRA with pk {lora_pk} is already in a private model and cannot be added."
-                    )
+            raise ValidationError(
+                f"LoRAs with pk {pks} are already in a private model and cannot be added."
+            )
+        raise ValidationError(
+            f"LoRAs with pk {pks} are in a private model and cannot be added to another model."
+        )
+
+
+def refresh_lora_visibility(lora_ids):
+    """
+    Recompute in_private_model / in_public_model for the given LoRAs in one UPDATE.
+    """
+    lora_ids = list(lora_ids)
+    if not lora_ids:
+        return
+    memberships = Model.loras.through.objects.filter(lora_id=OuterRef("pk"))
+    LoRA.objects.filter(pk__in=lora_ids).update(
+        in_private_model=Exists(memberships.filter(model__model_type=Model.PRIVATE)),
+        in_public_model=Exists(memberships.filter(model__model_type=Model.PUBLIC)),
+    )
+
+
+@receiver(m2m_changed, sender=Model.loras.through)
+def sync_lora_visibility(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # The rows are gone by post_clear, so note who is affected now.
+        if reverse:
+            instance._cleared_lora_ids = [instance.pk]
         else:
-            for lora_pk in pk_set:
-                conflicts = model.objects.filter(
-                    pk=lora_pk, models__model_type=Model.PRIVATE
-                )
-                if conflicts.exists():
-                    raise ValidationError(
-                        f"LoRA with pk {lora_pk} is in a private model and cannot be added to another model."
-                    )
+            instance._cleared_lora_ids = list(
+                instance.loras.values_list("pk", flat=True)
+            )
+    elif action == "post_clear":
+        refresh_lora_visibility(getattr(instance, "_cleared_lora_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_lora_visibility([instance.pk] if reverse else pk_set)
+
+
+@receiver(post_save, sender=Model)
+def sync_lora_visibility_on_type_change(sender, instance, created, **kwargs):
+    if created:
+        if instance.model_type == Model.PUBLIC:
+            adjust_profile_stats(instance.creator_id, public_model_count=1)
+        instance._loaded_model_type = instance.model_type
+        return
+    loaded_type = getattr(instance, "_loaded_model_type", None)
+    if loaded_type != instance.model_type:
+        refresh_lora_visibility(instance.loras.values_list("pk", flat=True))
+        if loaded_type is not None:
+            adjust_profile_stats(
+                instance.creator_id,
+                public_model_count=1 if instance.model_type == Model.PUBLIC else -1,
+            )
+        instance._loaded_model_type = instance.model_type
+
+
+@receiver(pre_delete, sender=Model)
+def remember_loras_of_deleted_model(sender, instance, **kwargs):
+    instance._cleared_lora_ids = list(instance.loras.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Model)
+def sync_lora_visibility_on_delete(sender, instance, **kwargs):
+    refresh_lora_visibility(getattr(instance, "_cleared_lora_ids", []))
+    if instance.model_type == Model.PUBLIC:
+        adjust_profile_stats(instance.creator_id, public_model_count=-1)
+
+
+@receiver(post_save, sender=LoRA)
+def count_librarian_lora(sender, instance, created, **kwargs):
+    if created:
+        adjust_profile_stats(instance.librarian_id, lora_count=1)
+
+
+@receiver(post_delete, sender=LoRA)
+def uncount_librarian_lora(sender, instance, **kwargs):
+    adjust_profile_stats(instance.librarian_id, lora_count=-1)
+
+
+@receiver(m2m_changed, sender=Model.allowed_users.through)
+def invalidate_model_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and not reverse:
+        instance._cleared_user_ids = list(
+            instance.allowed_users.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        forget_accessible_models(
+            [instance.pk] if reverse else getattr(instance, "_cleared_user_ids", [])
+        )
+    elif action in ("post_add", "post_remove"):
+        forget_accessible_models([instance.pk] if reverse else pk_set)
+
+
+# --- Card summaries ---
+def _count_of(queryset, field):
+    """Correlated COUNT(*) of `queryset` grouped by `field`, 0 when empty."""
+    counts = queryset.values(field).annotate(n=Count("pk")).values("n")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def refresh_lora_cards(lora_ids):
+    """Recompute image_count, cover_image and likes_total for the given LoRAs."""
+    images = LoRAImage.objects.filter(lora_id=OuterRef("pk"))
+    LoRA.objects.filter(pk__in=list(lora_ids)).update(
+        image_count=_count_of(images, "lora_id"),
+        cover_image=Coalesce(
+            Subquery(images.order_by("pk").values("image")[:1]), Value("")
+        ),
+        likes_total=_count_of(
+            LoRA.liked_by.through.objects.filter(lora_id=OuterRef("pk")), "lora_id"
+        ),
+    )
+
+
+def refresh_model_cards(model_ids):
+    """Recompute likes_total and lora_count for the given models."""
+    Model.objects.filter(pk__in=list(model_ids)).update(
+        likes_total=_count_of(
+            Model.liked_by.through.objects.filter(model_id=OuterRef("pk")), "model_id"
+        ),
+        lora_count=_count_of(
+            Model.loras.through.objects.filter(model_id=OuterRef("pk")), "model_id"
+        ),
+    )
+
+
+@receiver(post_save, sender=LoRAImage)
+def sync_lora_card_images(sender, instance, **kwargs):
+    refresh_lora_cards([instance.lora_id])
+
+
+@receiver(post_delete, sender=LoRAImage)
+def sync_lora_card_on_image_delete(sender, instance, origin=None, **kwargs):
+    # Images only cascade from their LoRA being deleted; its card goes too.
+    if isinstance(origin, LoRAImage) or (
+        isinstance(origin, models.QuerySet) and origin.model is LoRAImage
+    ):
+        refresh_lora_cards([instance.lora_id])
+
+
+@receiver(post_delete, sender=LoRAImage)
+@receiver(post_delete, sender=Model)
+def delete_files_of_deleted_row(sender, instance, **kwargs):
+    instance.delete_tracked_files()
+
+
+@receiver(m2m_changed, sender=LoRA.liked_by.through)
+def sync_lora_card_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_lora_cards([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_liked_lora_ids = list(
+            instance.liked_loras.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        refresh_lora_cards(getattr(instance, "_cleared_liked_lora_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_lora_cards(pk_set)
+
+
+@receiver(m2m_changed, sender=Model.liked_by.through)
+def sync_model_card_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_model_cards([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_liked_model_ids = list(
+            instance.liked_models.values_list("pk", flat=True)
+        )
+    elif action == "post_clear":
+        refresh_model_cards(getattr(instance, "_cleared_liked_model_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_model_cards(pk_set)
+
+
+@receiver(m2m_changed, sender=Model.loras.through)
+def sync_model_card_lora_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_model_cards([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_model_ids = list(instance.models.values_list("pk", flat=True))
+    elif action == "post_clear":
+        refresh_model_cards(getattr(instance, "_cleared_model_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_model_cards(pk_set)
+
+
+@receiver(pre_delete, sender=LoRA)
+def remember_models_of_deleted_lora(sender, instance, **kwargs):
+    instance._cleared_model_ids = list(instance.models.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=LoRA)
+def sync_model_cards_on_lora_delete(sender, instance, **kwargs):
+    refresh_model_cards(getattr(instance, "_cleared_model_ids", []))
 
 
 class LoRARating(models.Model):
@@ -228,5 +470,41 @@ class LoRARating(models.Model):
     rating = models.PositiveSmallIntegerField()  # e.g., rating 1-5
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def submit(cls, lora, user, value):
+        """
+        Create or change `user`'s rating of `lora` and apply the difference
+        to the LoRA's stored totals, without re-aggregating every rating.
+        """
+        with transaction.atomic():
+            previous = (
+                cls.objects.select_for_update()
+                .filter(lora=lora, user=user)
+                .values_list("rating", flat=True)
+                .first()
+            )
+            if previous is None:
+                cls.objects.create(lora=lora, user=user, rating=value)
+                delta_sum, delta_count = value, 1
+            else:
+                cls.objects.filter(lora=lora, user=user).update(rating=value)
+                delta_sum, delta_count = value - previous, 0
+            if delta_sum or delta_count:
+                LoRA.objects.filter(pk=lora.pk).update(
+                    **aggregate_update(delta_sum, delta_count, average_field="rating")
+                )
+
     def __str__(self):
         return f"{self.rating} for {self.lora.title} by {self.user.username}"
+
+
+@receiver(post_delete, sender=LoRARating)
+def remove_rating_from_lora_totals(sender, instance, origin=None, **kwargs):
+    # Ratings removed by deleting their LoRA leave no totals to fix.
+    if isinstance(origin, LoRA) or (
+        isinstance(origin, models.QuerySet) and origin.model is LoRA
+    ):
+        return
+    LoRA.objects.filter(pk=instance.lora_id).update(
+        **aggregate_update(-instance.rating, -1, average_field="rating")
+    )
@@ -0,0 +1,14 @@
+from django import template
+
+from listings.access import can_view
+
+register = template.Library()
+
+
+@register.filter
+def viewable_by(model, user):
+    """
+    {% if model|viewable_by:user %} - True when `user` may see the model's details.
+    Uses the user's cached accessible-model ids, so it costs no query per card.
+    """
+    return can_view(user, model)
@@ -13,12 +13,29 @@ def get_user_rating(ratings, user):
     except Exception:
         return None
     
+@register.filter
+def rating_for(user_ratings, user):
+    """
+    Look up a rating in the {user_id: rating} map the view built in one query.
+    Accepts a user or a user id. Returns None if that user has not rated.
+    """
+    if not user_ratings:
+        return None
+    return user_ratings.get(getattr(user, 'pk', user))
+
+
 @register.filter
 def get_average_rating(ratings):
     """
     Given a RelatedManager or iterable of rating objects (with a 'rating' attr),
     return the rounded average (0–5).
     """
+    # Related managers (lora.ratings) know their owner; use its stored totals.
+    owner = getattr(ratings, 'instance', None)
+    if owner is not None and hasattr(owner, 'rating_count'):
+        if not owner.rating_count:
+            return 0
+        return round(owner.rating_sum / owner.rating_count)
     qs = ratings.all() if hasattr(ratings, 'all') else ratings
     try:
         count = qs.count()
@@ -27,4 +44,10 @@ def get_average_rating(ratings):
     if not count:
         return 0
     total = sum(getattr(r, 'rating', r) for r in qs)
-    return round(total / count)
\ No newline at end of file
+    return round(total / count)
+
+
+@register.filter
+def star_rating(average):
+    """A stored average rating (float or None) as whole stars, 0-5."""
+    return round(average or 0)
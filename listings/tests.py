@@ -1,3 +1,448 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from io import BytesIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from mysite.versioning import StaleObjectError
+
+from .comment_feed import CommentFeed
+from .media_gc import gc_media, sweep_tombstones
+from .models import Comment, FileTombstone, LoRA, LoRAImage, LoRARating, Model
+from .uploads import add_lora_images
+
+User = get_user_model()
+
+# Keep tests off S3.
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
+
+def png_bytes(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pw", **extra
+    )
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+class ListingDetailQueryCountTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner", role="librarian")
+        self.viewer = make_user("viewer")
+        self.lora = LoRA.objects.create(
+            title="Test LoRA", description="desc", location="here", librarian=self.owner
+        )
+        LoRARating.submit(self.lora, self.viewer, 5)
+        self.client.force_login(self.viewer)
+
+    def add_comments(self, count):
+        for _ in range(count):
+            author = make_user(f"author{User.objects.count()}")
+            LoRARating.submit(self.lora, author, 4)
+            comment = Comment.objects.create(lora=self.lora, user=author, comment="hi")
+            comment.liked_by.add(self.viewer)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("listing_detail", args=[self.lora.pk]))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        self.add_comments(1)
+        baseline = self.count_queries()
+        self.add_comments(10)
+        self.assertEqual(self.count_queries(), baseline)
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+class LoRASearchQueryCountTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner", role="librarian")
+        self.viewer = make_user("viewer")
+        self.client.force_login(self.viewer)
+
+    def add_loras(self, count):
+        for _ in range(count):
+            lora = LoRA.objects.create(
+                title="Card", description="desc", location="here", librarian=self.owner
+            )
+            LoRAImage.objects.create(lora=lora)
+            LoRAImage.objects.create(lora=lora)
+            lora.liked_by.add(self.viewer)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("lora_search"))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_card_summaries_are_stored(self):
+        self.add_loras(1)
+        lora = LoRA.objects.get()
+        self.assertEqual(lora.image_count, 2)
+        self.assertEqual(lora.likes_total, 1)
+        self.assertTrue(lora.cover_image)
+
+    def test_query_count_does_not_grow_with_cards(self):
+        self.add_loras(1)
+        baseline = self.count_queries()
+        self.add_loras(10)
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_deleting_images_refreshes_cards_only_when_the_lora_stays(self):
+        self.add_loras(1)
+        lora = LoRA.objects.get()
+        lora.images.first().delete()
+        lora.refresh_from_db()
+        self.assertEqual(lora.image_count, 1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            lora.delete()
+        card_updates = [
+            q for q in ctx.captured_queries
+            if q["sql"].startswith('UPDATE "listings_lora"')
+        ]
+        self.assertEqual(card_updates, [])
+
+
+class CommentFeedTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner", role="librarian")
+        self.lora = LoRA.objects.create(
+            title="Test LoRA", description="desc", location="here", librarian=self.owner
+        )
+        for i in range(5):
+            Comment.objects.create(lora=self.lora, user=self.owner, comment=str(i))
+
+    def test_cursor_walks_every_comment_once(self):
+        seen, cursor = [], None
+        while True:
+            page = CommentFeed(self.lora.comments.all(), self.owner, cursor, page_size=2)
+            seen.extend(c.pk for c in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        expected = list(self.lora.comments.order_by("-created_at", "-pk").values_list("pk", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get(
+            reverse("lora_comments", args=[self.lora.pk]), {"cursor": "nope"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_replies_load_as_one_subtree(self):
+        root = self.lora.comments.order_by("pk").first()
+        reply = Comment.objects.create(lora=self.lora, user=self.owner, comment="r", parent=root)
+        nested = Comment.objects.create(lora=self.lora, user=self.owner, comment="rr", parent=reply)
+        self.assertEqual(nested.path, root.path + f"{reply.pk:010d}/{nested.pk:010d}/")
+        self.assertEqual(nested.depth, 2)
+
+        with self.assertNumQueries(1):
+            replies = CommentFeed.replies_to(root, AnonymousUser())
+        self.assertEqual([c.pk for c in replies], [reply.pk, nested.pk])
+        # Replies stay out of the top-level feed, and the root counts them all.
+        # Page, reply counts for the whole page, liked ids.
+        with self.assertNumQueries(3):
+            top = CommentFeed(self.lora.comments.all(), self.owner)
+        counts = {c.pk: c.num_replies for c in top}
+        self.assertEqual(counts.pop(root.pk), 2)
+        self.assertEqual(set(counts.values()), {0})
+        self.assertNotIn(reply.pk, [c.pk for c in top])
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+class VersionedSaveTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner")
+        self.lora = LoRA.objects.create(
+            title="Versioned", description="x" * 2000, location="here", librarian=self.owner
+        )
+
+    def _update_sql(self, **save_kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            LoRA.objects.get(pk=self.lora.pk).save(**save_kwargs)
+        return [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+
+    def test_partial_save_writes_only_listed_columns(self):
+        (full,) = self._update_sql()
+        (partial,) = self._update_sql(update_fields=["status"])
+        self.assertNotIn('"description"', partial)
+        self.assertIn('"version"', partial)
+        self.assertLess(len(partial), len(full))
+
+    def test_stale_instance_cannot_overwrite(self):
+        first = LoRA.objects.get(pk=self.lora.pk)
+        second = LoRA.objects.get(pk=self.lora.pk)
+        first.status = LoRA.BEING_REPAIRED
+        first.save(update_fields=["status"])
+
+        second.title = "Overwritten"
+        with self.assertRaises(StaleObjectError), transaction.atomic():
+            second.save(update_fields=["title"])
+
+        self.lora.refresh_from_db()
+        self.assertEqual(self.lora.status, LoRA.BEING_REPAIRED)
+        self.assertEqual(self.lora.title, "Versioned")
+        self.assertEqual(self.lora.version, 1)
+
+    def test_view_count_does_not_clobber_status_change(self):
+        loaded = LoRA.objects.get(pk=self.lora.pk)
+        self.client.get(reverse("listing_detail", args=[self.lora.pk]))
+        loaded.status = LoRA.BEING_REPAIRED
+        loaded.save(update_fields=["status"])
+
+        self.lora.refresh_from_db()
+        self.assertEqual(self.lora.views, 1)
+        self.assertEqual(self.lora.status, LoRA.BEING_REPAIRED)
+
+
+@override_settings(
+    STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp(), MEDIA_SWEEP_ON_COMMIT=False
+)
+class FileCleanupTests(TestCase):
+    def setUp(self):
+        self.owner = make_user("owner")
+
+    def _model_with_image(self, filename="a.jpg"):
+        created = Model.objects.create(
+            title="m", creator=self.owner, image=SimpleUploadedFile(filename, b"a")
+        )
+        return Model.objects.get(pk=created.pk)
+
+    def test_replaced_image_is_tombstoned_without_a_reread(self):
+        model = self._model_with_image()
+        old_name = model.image.name
+        model.image = SimpleUploadedFile("b.jpg", b"b")
+
+        with CaptureQueriesContext(connection) as ctx:
+            model.save()
+        rereads = [q for q in ctx.captured_queries if q["sql"].startswith("SELECT") and '"listings_model"' in q["sql"]]
+        self.assertEqual(rereads, [])
+        self.assertTrue(FileTombstone.objects.filter(name=old_name).exists())
+
+        self.assertEqual(sweep_tombstones(), 1)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertTrue(default_storage.exists(model.image.name))
+        self.assertFalse(FileTombstone.objects.exists())
+
+    def test_rolled_back_delete_keeps_the_file(self):
+        model = self._model_with_image()
+        try:
+            with transaction.atomic():
+                model.delete()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(FileTombstone.objects.exists())
+        self.assertEqual(sweep_tombstones(), 0)
+        self.assertTrue(default_storage.exists(model.image.name))
+
+    def test_counter_save_leaves_files_alone(self):
+        model = self._model_with_image()
+        model.title = "renamed"
+        model.save(update_fields=["title"])
+        self.assertFalse(FileTombstone.objects.exists())
+
+    def test_gc_media_reclaims_only_orphans(self):
+        kept = self._model_with_image().image.name
+        orphan = default_storage.save("collections/orphan.jpg", ContentFile(b"o"))
+
+        # MEDIA_ROOT is shared by this class, so other tests' files may show up too.
+        orphans = gc_media(grace=timedelta(0), dry_run=True)
+        self.assertIn(orphan, orphans)
+        self.assertNotIn(kept, orphans)
+        gc_media(grace=timedelta(0))
+        sweep_tombstones()
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(kept))
+        # Fresh uploads are left alone until the grace period passes.
+        fresh = default_storage.save("collections/fresh.jpg", ContentFile(b"f"))
+        self.assertEqual(gc_media(), [])
+        self.assertTrue(default_storage.exists(fresh))
+
+
+@override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp())
+class ParallelUploadTests(TestCase):
+    def setUp(self):
+        self.lora = LoRA.objects.create(title="l", librarian=make_user("owner"))
+        LoRAImage.objects.create(lora=self.lora)
+
+    def test_batch_replaces_placeholder_and_refreshes_card(self):
+        files = [SimpleUploadedFile("same.png", png_bytes(10 + i, 10)) for i in range(3)]
+        images = add_lora_images(self.lora, files)
+
+        names = [image.image.name for image in images]
+        self.assertEqual(len(set(names)), 3)
+        for index, name in enumerate(names):
+            with default_storage.open(name) as f:
+                self.assertEqual(Image.open(f).size, (10 + index, 10))
+        self.assertEqual(
+            sorted(self.lora.images.values_list("image", flat=True)), sorted(names)
+        )
+        self.lora.refresh_from_db()
+        self.assertEqual(self.lora.image_count, 3)
+
+    def test_failed_write_removes_the_files_already_stored(self):
+        class Broken:
+            name = "broken.jpg"
+
+            def __getattr__(self, attr):
+                raise OSError("upload failed")
+
+        good = SimpleUploadedFile("good.png", png_bytes(4, 4))
+        with self.assertRaises(Exception):
+            add_lora_images(self.lora, [good, Broken()])
+        self.assertEqual(self.lora.images.count(), 1)
+        _, stored = default_storage.listdir("items")
+        self.assertFalse([name for name in stored if "good" in name])
+
+    @override_settings(IMAGE_MAX_DIMENSION=32)
+    def test_large_originals_are_scaled_down_before_storage(self):
+        (image,) = add_lora_images(
+            self.lora, [SimpleUploadedFile("big.png", png_bytes(200, 100))]
+        )
+        with default_storage.open(image.image.name) as f:
+            self.assertEqual(Image.open(f).size, (32, 16))
+
+    @override_settings(IMAGE_MAX_PIXELS=10_000)
+    def test_oversized_upload_is_a_form_error(self):
+        user = make_user("editor", role="librarian")
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse("lora_create"),
+            {
+                "title": "t",
+                "description": "d",
+                "location": "l",
+                "images": [SimpleUploadedFile("huge.png", png_bytes(200, 200))],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "megapixels")
+        self.assertFalse(LoRA.objects.filter(title="t").exists())
+
+
+@override_settings(
+    STORAGES=LOCAL_STORAGES,
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    DIRECT_UPLOAD_BACKEND="mysite.direct_uploads.LocalUploadBackend",
+    BACKGROUND_TASKS_INLINE=True,
+)
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        self.user = make_user("uploader", role="librarian")
+        self.client.force_login(self.user)
+
+    def _upload(self, content=png_bytes(8, 8)):
+        signed = self.client.post(
+            reverse("sign_upload"),
+            {"purpose": "lora_image", "filename": "photo.PNG", "content_type": "image/png"},
+        ).json()
+        sent = self.client.post(
+            signed["url"],
+            {**signed["fields"], "file": SimpleUploadedFile("photo.png", content)},
+        )
+        self.assertEqual(sent.status_code, 204)
+        return signed
+
+    def _create(self, token):
+        return self.client.post(
+            reverse("lora_create"),
+            {"title": "t", "description": "d", "location": "l", "uploaded_images": token},
+        )
+
+    def test_claimed_upload_becomes_a_lora_image(self):
+        signed = self._upload()
+        self.assertEqual(self._create(signed["token"]).status_code, 302)
+
+        image = LoRAImage.objects.get()
+        self.assertEqual(image.image.name, signed["fields"]["key"])
+        self.assertTrue(image.image.name.startswith("items/"))
+        with default_storage.open(image.image.name) as f:
+            self.assertEqual(Image.open(f).size, (8, 8))
+
+    @override_settings(IMAGE_MAX_DIMENSION=4)
+    def test_claimed_upload_is_scaled_down(self):
+        signed = self._upload(png_bytes(8, 6))
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create(signed["token"])
+
+        image = LoRAImage.objects.get()
+        self.assertEqual(image.image.name, signed["fields"]["key"])
+        with default_storage.open(image.image.name) as f:
+            self.assertEqual(Image.open(f).size, (4, 3))
+
+    def test_tokens_are_single_use_and_per_user(self):
+        signed = self._upload()
+        self._create(signed["token"])
+        self.assertEqual(self._create(signed["token"]).status_code, 400)
+
+        other = self._upload()
+        self.client.force_login(make_user("other", role="librarian"))
+        self.assertEqual(self._create(other["token"]).status_code, 400)
+        self.assertEqual(LoRAImage.objects.count(), 1)
+
+    def test_stale_edit_drops_the_claimed_upload(self):
+        lora = LoRA.objects.create(title="t", librarian=self.user)
+        LoRA.objects.get(pk=lora.pk).save()  # someone else saves first
+        signed = self._upload()
+        response = self.client.post(
+            reverse("lora_edit", args=[lora.pk]),
+            {
+                "title": "mine",
+                "description": "d",
+                "location": "l",
+                "version": 0,
+                "uploaded_images": signed["token"],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(LoRAImage.objects.exists())
+        self.assertTrue(
+            FileTombstone.objects.filter(name=signed["fields"]["key"]).exists()
+        )
+
+    def test_only_matching_raster_types_are_signed(self):
+        for filename, content_type in (
+            ("x.svg", "image/svg+xml"),
+            ("x.png", "image/svg+xml"),
+            ("x.jpg", "image/png"),
+        ):
+            response = self.client.post(
+                reverse("sign_upload"),
+                {"purpose": "avatar", "filename": filename, "content_type": content_type},
+            )
+            self.assertEqual(response.status_code, 400, content_type)
+
+    def test_local_endpoint_enforces_the_policy(self):
+        signed = self.client.post(
+            reverse("sign_upload"),
+            {"purpose": "avatar", "filename": "a.jpg", "content_type": "image/jpeg"},
+        ).json()
+        fields = {**signed["fields"], "key": "items/elsewhere.jpg"}
+        sent = self.client.post(
+            signed["url"], {**fields, "file": SimpleUploadedFile("a.jpg", b"a")}
+        )
+        self.assertEqual(sent.status_code, 403)
+        self.assertFalse(default_storage.exists("items/elsewhere.jpg"))
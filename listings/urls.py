@@ -8,11 +8,14 @@ urlpatterns = [
     path("lora/create/", views.listing_create, name="lora_create"),
     path("my-loras/", views.my_loras, name="my_listings"),
     path("lora/<int:pk>/", views.listing_detail, name="listing_detail"),
+    path("lora/<int:pk>/comments/", views.lora_comments, name="lora_comments"),
     path("delete/<int:pk>/", views.lora_delete, name="lora_delete"),
     path("comment/delete/<int:pk>/", views.comment_delete, name="comment_delete"),
     path("like/<int:pk>/", views.like_listing, name="like_listing"),
     path("comment/<int:pk>/like/", views.like_comment, name="like_comment"),
+    path("comment/<int:pk>/replies/", views.comment_replies, name="comment_replies"),
     path("model/<int:pk>/", views.model_detail, name="model_detail"),
+    path("model/<int:pk>/comments/", views.model_comments, name="model_comments"),
     path("model/create/", views.model_create, name="model_create"),
     path("model/<int:pk>/delete/", views.model_delete, name="model_delete"),
     path("model/<int:pk>/edit/", views.model_edit, name="model_edit"),
@@ -21,6 +24,7 @@ urlpatterns = [
         views.model_add_lora,
         name="model_add_lora",
     ),
+    path("model/<int:pk>/add-loras/", views.model_add_loras, name="model_add_loras"),
     path(
         "model/<int:model_pk>/remove-lora/<int:lora_pk>/",
         views.model_remove_lora,
@@ -0,0 +1,29 @@
+"""
+Per-request "what has the viewer liked" lookups for list and detail pages.
+
+Checking `user in obj.liked_by.all` in a template loads every liker of every
+card. ViewerState instead asks once per object type which of the objects on
+the page the current user has liked, and templates test membership with
+`{% if lora.pk in viewer_state.liked_lora_ids %}`.
+"""
+
+
+def _liked_ids(user, relation, objects):
+    ids = [obj.pk for obj in objects]
+    if not ids or not user.is_authenticated:
+        return frozenset()
+    return frozenset(
+        getattr(user, relation).filter(pk__in=ids).values_list("pk", flat=True)
+    )
+
+
+class ViewerState:
+    """
+    Liked LoRA, Model and Comment ids for `user`, limited to the objects given.
+    Passing a queryset evaluates it, and the template reuses that result.
+    """
+
+    def __init__(self, user, loras=(), models=(), comments=()):
+        self.liked_lora_ids = _liked_ids(user, "liked_loras", loras)
+        self.liked_model_ids = _liked_ids(user, "liked_models", models)
+        self.liked_comment_ids = _liked_ids(user, "liked_comments", comments)
@@ -1,20 +1,28 @@
-import requests
-import logging
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.core.files.base import ContentFile
 from django.core.mail import send_mail
-from django.db.models import Avg, Count, Q
+from django.db import transaction
+from django.db.models import F, Q
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from notifications.signals import notify
-from django.views.decorators.csrf import csrf_exempt
+from mysite import http_client
+from mysite.direct_uploads import claim_uploads
+from mysite.images import inspect_image
+from mysite.throttling import async_single_flight, flight_key, rate_limit
+from mysite.versioning import StaleObjectError
+from .access import can_view
+from .comment_feed import CommentFeed, feed_page_response, reply_parent
+from .viewer_state import ViewerState
 from .forms import CommentForm, LoRAForm, LoRAStatusForm, ModelForm
+from .media_gc import tombstone
 from .models import *
+from .uploads import add_lora_images, attach_lora_images, validate_images
 import re
 import json as pyjson
-import requests
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
@@ -29,7 +37,7 @@ def filter_private_loras(queryset=None):
     """
     if queryset is None:
         queryset = LoRA.objects.all()
-    return queryset.exclude(models__model_type=Model.PRIVATE).distinct()
+    return queryset.filter(in_private_model=False)
 
 
 def filter_public_loras(queryset=None):
@@ -38,13 +46,13 @@ def filter_public_loras(queryset=None):
     """
     if queryset is None:
         queryset = LoRA.objects.all()
-    return queryset.exclude(models__model_type=Model.PUBLIC).distinct()
+    return queryset.filter(in_public_model=False)
 
 
 def model_list(request):
     query = request.GET.get("q", "")
     sort_by = request.GET.get("sort", "")
-    models = Model.objects.all().annotate(num_loras=Count("loras"))
+    models = Model.objects.select_related("creator")
 
     # For non-authenticated users, only show public models.
     if not request.user.is_authenticated:
@@ -57,13 +65,14 @@ def model_list(request):
         )
 
     if sort_by == "loras":
-        models = models.order_by("-num_loras")
+        models = models.order_by("-lora_count")
     elif sort_by == "views":
         models = models.order_by("-views")
     # Additional sorting logic can remain here.
 
     context = {
         "models": models,
+        "viewer_state": ViewerState(request.user, models=models),
     }
     return render(request, "model_list.html", context)
 
@@ -71,10 +80,10 @@ def model_list(request):
 def listing_detail(request, pk):
     # Use LoRA instead of Item
     lora = get_object_or_404(LoRA, pk=pk)
-    # Increment view count safely.
+    # Increment view count in the database; it must not touch other columns.
+    LoRA.objects.filter(pk=lora.pk).update(views=F("views") + 1)
     lora.views += 1
-    lora.save()
-    comments = lora.comments.all().order_by("-created_at")
+    comments, user_ratings = lora_comment_page(request, lora)
 
     if request.method == "POST":
         comment_form = CommentForm(request.POST)
@@ -83,6 +92,7 @@ def listing_detail(request, pk):
             # Associate the comment with the lora.
             comment.lora = lora
             comment.user = request.user
+            comment.parent = reply_parent(request, lora.comments.all())
             comment.save()
             return redirect("listing_detail", pk=lora.pk)
     else:
@@ -92,10 +102,43 @@ def listing_detail(request, pk):
         "listing": lora,  # kept as "listing" for template compatibility.
         "comments": comments,
         "comment_form": comment_form,
+        "user_ratings": user_ratings,
+        "viewer_state": ViewerState(request.user, loras=[lora]),
     }
     return render(request, "listing_detail.html", context)
 
 
+def lora_comment_page(request, lora, cursor=None):
+    """
+    A page of `lora`'s comments plus {user_id: rating} for their authors and
+    the viewer, loaded in one query.
+    """
+    comments = CommentFeed(lora.comments.all(), request.user, cursor)
+    return comments, comment_author_ratings(request, lora, comments)
+
+
+def comment_author_ratings(request, lora, comments):
+    rater_ids = {comment.user_id for comment in comments}
+    if request.user.is_authenticated:
+        rater_ids.add(request.user.pk)
+    return dict(
+        lora.ratings.filter(user_id__in=rater_ids).values_list("user_id", "rating")
+    )
+
+
+def lora_comments(request, pk):
+    """Next page of a LoRA's comments for the "Load more" button."""
+    lora = get_object_or_404(LoRA, pk=pk)
+    try:
+        comments, user_ratings = lora_comment_page(
+            request, lora, request.GET.get("cursor")
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    context = {"listing": lora, "comments": comments, "user_ratings": user_ratings}
+    return feed_page_response(request, "lora_comment_rows.html", context)
+
+
 @login_required
 def like_listing(request, pk):
     # Update using LoRA
@@ -122,17 +165,15 @@ def listing_create(request):
         uploaded_files = request.FILES.getlist("images")
         autofill_json = request.POST.get("autofill_images", "")
 
-        if form.is_valid():
+        if form.is_valid() and validate_images(form, uploaded_files):
+            uploaded_keys = claim_uploads(request, "lora_image", "uploaded_images")
             lora = form.save(commit=False)
             lora.librarian = request.user
             lora.status = LoRA.CHECKED_IN
             lora.save()
 
-            # 1) Save manually uploaded images
-            for img in uploaded_files:
-                LoRAImage.objects.create(lora=lora, image=img)
-
-            # 2) Save autofill images
+            # 1) Collect autofill images to store with the uploaded ones
+            autofill_files = []
             if autofill_json:
                 try:
                     urls = pyjson.loads(autofill_json)
@@ -140,17 +181,22 @@ def listing_create(request):
                     urls = []
                 for idx, url in enumerate(urls[:5]):
                     try:
-                        resp = requests.get(url, timeout=10)
+                        resp = http_client.get(url, timeout=10)
                         if resp.status_code == 200:
                             ext = url.split("?")[0].rsplit(".", 1)[-1]
                             fname = f"autofill_{lora.pk}_{idx}.{ext}"
                             content = ContentFile(resp.content, name=fname)
-                            LoRAImage.objects.create(lora=lora, image=content)
+                            inspect_image(content)
+                            autofill_files.append(content)
                     except Exception:
                         continue
 
+            # 2) Write all images to storage in parallel
+            added = add_lora_images(lora, [*uploaded_files, *autofill_files])
+            added += attach_lora_images(lora, uploaded_keys)
+
             # 3) If still no images, attach default
-            if not LoRAImage.objects.filter(lora=lora).exists():
+            if not added:
                 LoRAImage.objects.create(
                     lora=lora
                 )
@@ -295,10 +341,7 @@ def lora_delete(request, pk):
     if request.method == "POST":
         # Remove the lora from all models.
         lora.models.clear()
-        # Explicitly delete all associated images so that their file deletion logic in delete() is invoked.
-        for image in lora.images.all():
-            image.delete()
-        # Delete the lora.
+        # Delete the lora; its images cascade and their files are removed on commit.
         lora.delete()
         messages.success(request, "LoRA and associated images deleted successfully.")
         # Redirect to a suitable page (e.g., dashboard or listings list)
@@ -312,23 +355,18 @@ def model_detail(request, pk):
     # Check if user has access to model
     if request.user.is_authenticated and not request.user.is_superuser:
         model = get_object_or_404(Model, pk=pk)
-        if (
-            model.is_private
-            and request.user not in model.allowed_users.all()
-            and request.user != model.creator
-            and request.user.role != "librarian"
-        ):
+        if not can_view(request.user, model):
             return redirect("request_model_access", pk=model.pk)
     model = get_object_or_404(Model, pk=pk)
-    loras = model.loras.all()
+    loras = model.loras.prefetch_related("images")
     q = request.GET.get("q", "")
     if q:
         loras = loras.filter(Q(title__icontains=q) | Q(description__icontains=q))
-    # Retrieve comments associated with the model.
-    comments = model.model_comments.all().order_by("-created_at")
+    # First page of the comments; the rest load on demand from model_comments.
+    comments = CommentFeed(model.model_comments.all(), request.user)
 
+    Model.objects.filter(pk=model.pk).update(views=F("views") + 1)
     model.views += 1
-    model.save()
 
     if request.method == "POST":
         # Only authenticated users can comment.
@@ -340,6 +378,7 @@ def model_detail(request, pk):
             # Associate the comment with the model.
             comment.model = model
             comment.user = request.user
+            comment.parent = reply_parent(request, model.model_comments.all())
             comment.save()
             return redirect("model_detail", pk=model.pk)
     else:
@@ -350,10 +389,43 @@ def model_detail(request, pk):
         "loras": loras,
         "comments": comments,
         "comment_form": comment_form,
+        "viewer_state": ViewerState(request.user, loras=loras, models=[model]),
     }
     return render(request, "model_detail.html", context)
 
 
+def comment_replies(request, pk):
+    """Every reply under a top-level LoRA or model comment, for "View replies"."""
+    root = get_object_or_404(Comment.objects.select_related("lora", "model"), pk=pk)
+    if root.model_id and not can_view(request.user, root.model):
+        return JsonResponse({"error": "You do not have access to this model."}, status=403)
+    comments = CommentFeed.replies_to(root, request.user)
+    if root.lora_id:
+        context = {
+            "listing": root.lora,
+            "comments": comments,
+            "user_ratings": comment_author_ratings(request, root.lora, comments),
+        }
+        return feed_page_response(request, "lora_comment_rows.html", context)
+    context = {"model": root.model, "comments": comments}
+    return feed_page_response(request, "model_comment_rows.html", context)
+
+
+def model_comments(request, pk):
+    """Next page of a model's comments for the "Load more" button."""
+    model = get_object_or_404(Model, pk=pk)
+    if not can_view(request.user, model):
+        return JsonResponse({"error": "You do not have access to this model."}, status=403)
+    try:
+        comments = CommentFeed(
+            model.model_comments.all(), request.user, request.GET.get("cursor")
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    context = {"model": model, "comments": comments}
+    return feed_page_response(request, "model_comment_rows.html", context)
+
+
 @login_required
 def model_create(request):
     if request.method == "POST":
@@ -370,6 +442,8 @@ def model_create(request):
                 return error_view(request, error_message)
             model = form.save(commit=False)
             model.creator = request.user
+            for key in claim_uploads(request, "model_image", "uploaded_image")[:1]:
+                model.image = key
             model.save()
             form.save_m2m()
             return redirect("model_list")
@@ -390,6 +464,25 @@ def model_delete(request, pk):
     return render(request, "model_confirm_delete.html", {"model": model})
 
 
+def edit_conflict_form(form_class, request, instance, *args, **kwargs):
+    """
+    The edit form re-bound to the latest saved row after a StaleObjectError:
+    the user's input is kept, the hidden version now matches the database so
+    resubmitting overwrites deliberately, and a form error explains why.
+    """
+    instance.refresh_from_db()
+    data = request.POST.copy()
+    data["version"] = instance.version
+    form = form_class(data, *args, instance=instance, **kwargs)
+    form.is_valid()
+    form.add_error(
+        None,
+        f"'{instance.title}' was changed by someone else while you were editing. "
+        "Check the current values and save again.",
+    )
+    return form
+
+
 @login_required
 def model_edit(request, pk):
     model = get_object_or_404(Model, pk=pk)
@@ -398,8 +491,20 @@ def model_edit(request, pk):
     if request.method == "POST":
         form = ModelForm(request.POST, request.FILES, instance=model, request=request)
         if form.is_valid():
-            form.save()
-            return redirect("model_detail", pk=model.pk)
+            uploaded_keys = claim_uploads(request, "model_image", "uploaded_image")[:1]
+            for key in uploaded_keys:
+                form.instance.image = key
+            try:
+                with transaction.atomic():
+                    form.save()
+            except StaleObjectError:
+                # The claimed upload is attached to nothing; drop it.
+                tombstone(uploaded_keys)
+                form = edit_conflict_form(
+                    ModelForm, request, model, request.FILES, request=request
+                )
+            else:
+                return redirect("model_detail", pk=model.pk)
     else:
         form = ModelForm(instance=model, request=request)
     return render(request, "model_edit.html", {"form": form, "model": model})
@@ -416,6 +521,45 @@ def model_add_lora(request, model_pk, lora_pk):
     return redirect("model_detail", pk=model.pk)
 
 
+@login_required
+def model_add_loras(request, pk):
+    """
+    Add every LoRA selected on the search page in one POST. The private-model
+    constraint is checked once for the whole set and the through rows are
+    written by a single bulk insert inside model.loras.add().
+    """
+    model = get_object_or_404(Model, pk=pk)
+    if request.user != model.creator and request.user.role != "librarian":
+        raise PermissionDenied("You are not allowed to add LoRAs to this model.")
+    if request.method != "POST":
+        return redirect("model_lora_search", pk=model.pk)
+
+    try:
+        requested_ids = {int(i) for i in request.POST.getlist("lora_ids")}
+    except ValueError:
+        messages.error(request, "Invalid LoRA selection.")
+        return redirect("model_lora_search", pk=model.pk)
+
+    lora_ids = set(
+        LoRA.objects.filter(pk__in=requested_ids)
+        .exclude(models=model)
+        .values_list("pk", flat=True)
+    )
+    if not lora_ids:
+        messages.info(request, "No new LoRAs were selected.")
+        return redirect("model_lora_search", pk=model.pk)
+
+    try:
+        with transaction.atomic():
+            model.loras.add(*lora_ids)
+    except ValidationError as e:
+        messages.error(request, " ".join(e.messages))
+        return redirect("model_lora_search", pk=model.pk)
+
+    messages.success(request, f"{len(lora_ids)} LoRAs added successfully!")
+    return redirect("model_detail", pk=model.pk)
+
+
 @login_required
 def model_remove_lora(request, model_pk, lora_pk):
     model = get_object_or_404(Model, pk=model_pk)
@@ -465,13 +609,14 @@ def model_search_loras(request, pk):
     elif model.model_type == Model.PRIVATE:
         if query:
             loras = loras.filter(
-                Q(title__icontains=query) | Q(description__icontain=query)
+                Q(title__icontains=query) | Q(description__icontains=query)
             )
         # Exclude loras already added to the current model.
         loras = loras.exclude(pk__in=model.loras.values_list("pk", flat=True))
         loras = filter_private_loras(loras)
         loras = filter_public_loras(loras)
         loras = loras.order_by("-created_at")
+    loras = loras.prefetch_related("images")
     context = {
         "model": model,
         "loras": loras,
@@ -488,7 +633,8 @@ def model_create_lora(request, pk):
     if request.method == "POST":
         form = LoRAForm(request.POST,    request.FILES)
         images = request.FILES.getlist("images")
-        if form.is_valid():
+        if form.is_valid() and validate_images(form, images):
+            uploaded_keys = claim_uploads(request, "lora_image", "uploaded_images")
             lora = form.save(commit=False)
             lora.librarian = request.user
             lora.status = LoRA.CHECKED_IN
@@ -496,14 +642,14 @@ def model_create_lora(request, pk):
             # Associate new lora with the model.
             model.loras.add(lora)
             # Process uploaded images.
-            if images:
-                for image in images:
-                    LoRAImage.objects.create(lora=lora, image=image)
+            if images or uploaded_keys:
+                add_lora_images(lora, images)
+                attach_lora_images(lora, uploaded_keys)
             else:
                 default_image_url = "https://cs3240loraapp.s3.amazonaws.com/items/default_item_image.png"
 
                 try:
-                    response = requests.get(default_image_url)
+                    response = http_client.get(default_image_url)
                     if response.status_code == 200:
                         default_content = ContentFile(
                             response.content, name="default_item_image.png"
@@ -549,19 +695,27 @@ def lora_search(request):
     if status_filter:
         loras = loras.filter(status=status_filter)
 
-    loras = loras.annotate(num_likes=Count("liked_by"))
+    loras = loras.select_related("librarian").prefetch_related("images")
 
     if sort == "likes":
-        loras = loras.order_by("-num_likes")
+        loras = loras.order_by("-likes_total")
     elif sort == "views":
         loras = loras.order_by("-views")
+    elif sort == "top":
+        loras = loras.order_by("-rating_score", "-created_at")
     else:
         loras = loras.order_by("-created_at")
 
     context = {
         "loras": loras,
+        "viewer_state": ViewerState(request.user, loras=loras),
         "status_choices": LoRA.STATUS_CHOICES,
-        "sort_options": [("", "Newest"), ("likes", "Likes"), ("views", "Views")],
+        "sort_options": [
+            ("", "Newest"),
+            ("likes", "Likes"),
+            ("views", "Views"),
+            ("top", "Top Rated"),
+        ],
     }
     return render(request, "lora_search.html", context)
 
@@ -574,10 +728,18 @@ def lora_edit(request, pk):
     if request.method == "POST":
         form = LoRAForm(request.POST, request.FILES, instance=lora)
         new_images = request.FILES.getlist("images")
-        if form.is_valid():
-            form.save()
-            for image in new_images:
-                LoRAImage.objects.create(lora=lora, image=image)
+        if form.is_valid() and validate_images(form, new_images):
+            uploaded_keys = claim_uploads(request, "lora_image", "uploaded_images")
+            try:
+                with transaction.atomic():
+                    form.save()
+            except StaleObjectError:
+                # The claimed uploads are attached to nothing; drop them.
+                tombstone(uploaded_keys)
+                form = edit_conflict_form(LoRAForm, request, lora, request.FILES)
+                return render(request, "lora_edit.html", {"form": form, "lora": lora})
+            add_lora_images(lora, new_images)
+            attach_lora_images(lora, uploaded_keys)
             if request.user.role.strip().lower() == "librarian" and request.user != lora.librarian:
                 notify.send(
                     request.user,
@@ -601,9 +763,15 @@ def lora_edit_status(request, pk):
     if request.method == "POST":
         form = LoRAStatusForm(request.POST, instance=lora)
         if form.is_valid():
-            form.save()
-            messages.success(request, "LoRA status updated successfully.")
-            if lora.status == LoRA.CHECKED_OUT:
+            try:
+                with transaction.atomic():
+                    form.save()
+            except StaleObjectError:
+                form = edit_conflict_form(LoRAStatusForm, request, lora)
+                return render(
+                    request, "lora_status_edit.html", {"form": form, "lora": lora}
+                )
+            if "status" in form.changed_data and request.user != lora.librarian:
                 # Notify the librarian about the status change.
                 notify.send(
                     request.user,
@@ -663,15 +831,8 @@ def rate_lora(request, pk):
             messages.error(request, "Invalid rating submitted.")
             return redirect("listing_detail", pk=lora.pk)
 
-        # Create or update the rating by the current user
-        LoRARating.objects.update_or_create(
-            lora=lora, user=request.user, defaults={"rating": rating_value}
-        )
-
-        # Calculate the new average rating.
-        agg = lora.ratings.aggregate(avg=Avg("rating"))
-        lora.rating = agg["avg"] if agg["avg"] is not None else 0.0
-        lora.save()
+        # Create or update the rating and adjust the LoRA's stored totals.
+        LoRARating.submit(lora, request.user, rating_value)
 
         messages.success(request, "Your rating has been submitted.")
     return redirect("listing_detail", pk=lora.pk)
@@ -780,17 +941,22 @@ def extract_pixai_metadata(html_text, source_url):
         "author": "",
     }
 
-def parse_lora_from_hf(url, gemini_api_key):
-    resp = requests.get(url, timeout=15)
-    if resp.status_code != 200:
-        return {"error": "Could not fetch Hugging Face page."}
-
-    # extract image URLs via metadata parser
-    meta = extract_hf_metadata(resp.text, url)
+async def parse_lora_from_hf(url, gemini_api_key, html_text=None):
+    # Reuse the page when the caller already fetched it.
+    if html_text is None:
+        resp = await http_client.async_get(url)
+        if resp.status_code != 200:
+            return {"error": "Could not fetch Hugging Face page."}
+        html_text = resp.text
+
+    # extract image URLs via metadata parser (CPU-bound, keep it off the event loop)
+    meta = await sync_to_async(extract_hf_metadata, thread_sensitive=False)(
+        html_text, url
+    )
     images = meta.get("image_urls", [])
 
     # raw HTML snippet for LLM context
-    prompt_html = resp.text[:12000]
+    prompt_html = html_text[:12000]
 
     prompt = (
         "You are a JSON extraction assistant. Given a Hugging Face LoRA model page URL "
@@ -813,12 +979,12 @@ def parse_lora_from_hf(url, gemini_api_key):
     )
 
     llm_payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    llm_resp = requests.post(
+    llm_resp = await http_client.async_post(
         "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent",
         headers={"Content-Type": "application/json"},
         params={"key": gemini_api_key},
         json=llm_payload,
-        timeout=30,
+        timeout=(3.05, 30),
     )
     reply = llm_resp.json() \
         .get("candidates", [{}])[0] \
@@ -846,9 +1012,33 @@ def parse_lora_from_hf(url, gemini_api_key):
 
     return data
 
-@csrf_exempt
-def autofill_lora_from_link(request):
-    logger = logging.getLogger(__name__)
+async def fetch_autofill_info(lora_url, gemini_api_key):
+    """
+    Fetch and parse a LoRA page. Returns (payload, status_code).
+    """
+    parsed = urlparse(lora_url)
+    try:
+        resp = await http_client.async_get(lora_url)
+        resp.raise_for_status()
+    except Exception as e:
+        return {"error": f"Failed to fetch URL: {e}"}, 400
+
+    # Always call Gemini/HF parser first for title/desc/tags
+    info = await parse_lora_from_hf(lora_url, gemini_api_key, html_text=resp.text)
+
+    # If PixAI domain, override or append images with PixAI-specific URLs
+    if "pixai.art" in parsed.netloc:
+        pix_meta = await sync_to_async(extract_pixai_metadata, thread_sensitive=False)(
+            resp.text, lora_url
+        )
+        if pix_meta.get("image_urls"):
+            info["image_urls"] = pix_meta["image_urls"]
+
+    return info, 200
+
+
+@rate_limit("autofill")
+async def autofill_lora_from_link(request):
     if request.method == "POST":
         data = pyjson.loads(request.body)
         lora_url = data.get("url", "").strip()
@@ -860,21 +1050,15 @@ def autofill_lora_from_link(request):
         if not gemini_api_key:
             return JsonResponse({"error": "Missing API key."}, status=400)
 
-        try:
-            resp = requests.get(lora_url, timeout=15)
-            resp.raise_for_status()
-        except Exception as e:
-            return JsonResponse({"error": f"Failed to fetch URL: {e}"}, status=400)
-
-        # Always call Gemini/HF parser first for title/desc/tags
-        info = parse_lora_from_hf(lora_url, gemini_api_key)
+        # Identical links pasted at the same time share one upstream fetch.
+        info, status = await async_single_flight(
+            flight_key("autofill", lora_url),
+            lambda: fetch_autofill_info(lora_url, gemini_api_key),
+        )
+        return JsonResponse(info, status=status)
 
-        # If PixAI domain, override or append images with PixAI-specific URLs
-        if "pixai.art" in parsed.netloc:
-            pix_meta = extract_pixai_metadata(resp.text, lora_url)
-            if pix_meta.get("image_urls"):
-                info["image_urls"] = pix_meta["image_urls"]
+    return JsonResponse({"error": "Invalid request."}, status=400)
 
-        return JsonResponse(info)
 
-    return JsonResponse({"error": "Invalid request."}, status=400)
+# csrf_exempt only learns to wrap coroutine functions in Django 5.0.
+autofill_lora_from_link.csrf_exempt = True
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
 
 application = get_asgi_application()
+
+# The ASGI server keeps one event loop per worker, so pooled async clients pay off.
+from mysite import http_client  # noqa: E402
+
+http_client.keep_async_clients()
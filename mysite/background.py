@@ -0,0 +1,35 @@
+"""
+A small in-process worker for work that must not hold up a response.
+
+submit() hands a job to one background thread, normally from
+transaction.on_commit so the job sees committed rows. Each job gets its own
+database connection, closed when it finishes, and failures are logged rather
+than raised. With BACKGROUND_TASKS_INLINE = True (tests, local debugging)
+jobs run immediately in the caller instead.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+
+
+def _run(func, args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Background job %s failed.", func.__qualname__)
+    finally:
+        connection.close()
+
+
+def submit(func, *args):
+    if getattr(settings, "BACKGROUND_TASKS_INLINE", False):
+        func(*args)
+        return
+    _executor.submit(_run, func, args)
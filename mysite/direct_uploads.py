@@ -0,0 +1,260 @@
+"""
+Browser-to-storage image uploads.
+
+Posting images through a form streams every byte through a web worker, which
+then uploads it again to S3. With direct uploads the browser first asks
+sign_upload for a presigned POST, sends the file straight to the bucket, and
+submits the form with the signed token it was given instead of the file. The
+view then claims the token (claim_uploads) and stores the key like any other
+upload. Files that are uploaded but never claimed are reclaimed by gc_media.
+
+Claiming reads only the first HEADER_BYTES of each file (a ranged GET on S3)
+to apply the mysite.images limits, so the rest of the file never passes
+through the web worker. Files over the maximum side are scaled down in
+place by a background job once the claim commits.
+
+The backend is pluggable (DIRECT_UPLOAD_BACKEND): S3PresignedBackend signs
+real S3 POST policies, LocalUploadBackend hands out signed policies for the
+direct_upload_local endpoint, so the same flow runs offline and in tests.
+"""
+
+import os
+import uuid
+from functools import lru_cache
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousOperation, ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from . import background
+from .images import fit_image, inspect_image
+
+# purpose: (key prefix, model, field that stores the key)
+UPLOAD_TARGETS = {
+    "lora_image": ("items/", "listings.LoRAImage", "image"),
+    "model_image": ("collections/", "listings.Model", "image"),
+    "avatar": ("profile_pics/", "accounts.CustomUser", "image"),
+}
+# The signed Content-Type is what the bucket serves, so only raster types
+# (never e.g. image/svg+xml), each with the extensions that may carry it.
+IMAGE_TYPES = {
+    "image/jpeg": (".jpg", ".jpeg"),
+    "image/png": (".png",),
+    "image/gif": (".gif",),
+    "image/webp": (".webp",),
+}
+
+# Enough for the dimensions of any of IMAGE_TYPES, metadata included.
+HEADER_BYTES = 256 * 1024
+
+TOKEN_SALT = "direct-upload"
+POLICY_SALT = "direct-upload-policy"
+
+
+class S3PresignedBackend:
+    """Presigned POSTs against the bucket of the default (S3Boto3Storage) storage."""
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    def presign(self, key, content_type, max_size, expires):
+        client = self.storage.connection.meta.client
+        fields = {"Content-Type": content_type}
+        cache_control = self.storage.object_parameters.get("CacheControl")
+        if cache_control:
+            fields["Cache-Control"] = cache_control
+        conditions = [{name: value} for name, value in fields.items()]
+        conditions.append(["content-length-range", 1, max_size])
+        return client.generate_presigned_post(
+            Bucket=self.storage.bucket_name,
+            Key=self.storage._normalize_name(key),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=expires,
+        )
+
+    def exists(self, key):
+        return self.storage.exists(key)
+
+    def size(self, key):
+        return self.storage.size(key)
+
+    def head(self, key, length):
+        """The first `length` bytes of the object, by a ranged GET."""
+        response = self.storage.connection.meta.client.get_object(
+            Bucket=self.storage.bucket_name,
+            Key=self.storage._normalize_name(key),
+            Range=f"bytes=0-{length - 1}",
+        )
+        return response["Body"].read()
+
+
+class LocalUploadBackend:
+    """
+    Stand-in for S3: the "presigned POST" targets direct_upload_local, which
+    checks the signed policy and writes the file to the default storage.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    def presign(self, key, content_type, max_size, expires):
+        policy = signing.dumps(
+            {"key": key, "content_type": content_type, "max_size": max_size},
+            salt=POLICY_SALT,
+        )
+        return {
+            "url": reverse("direct_upload_local"),
+            "fields": {"key": key, "Content-Type": content_type, "policy": policy},
+        }
+
+    def accept(self, data, upload):
+        """Store `upload` if `data` (the posted fields) carries a valid policy."""
+        try:
+            policy = signing.loads(
+                data.get("policy", ""),
+                salt=POLICY_SALT,
+                max_age=settings.DIRECT_UPLOAD_EXPIRES,
+            )
+        except signing.BadSignature as e:
+            raise SuspiciousOperation("Invalid upload policy.") from e
+        if (
+            upload is None
+            or data.get("key") != policy["key"]
+            or data.get("Content-Type") != policy["content_type"]
+            or not 0 < upload.size <= policy["max_size"]
+        ):
+            raise SuspiciousOperation("Upload does not match its policy.")
+        if self.storage.save(policy["key"], upload) != policy["key"]:
+            raise SuspiciousOperation("Upload key already used.")
+
+    def exists(self, key):
+        return self.storage.exists(key)
+
+    def size(self, key):
+        return self.storage.size(key)
+
+    def head(self, key, length):
+        with self.storage.open(key) as stored:
+            return stored.read(length)
+
+
+@lru_cache(maxsize=None)
+def _backend_class(path):
+    return import_string(path)
+
+
+def get_backend():
+    return _backend_class(settings.DIRECT_UPLOAD_BACKEND)()
+
+
+def new_key(purpose, filename, content_type):
+    """
+    A fresh storage key for `purpose`, or ValueError unless `content_type`
+    is an allowed image type and matches the file's extension.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if purpose not in UPLOAD_TARGETS or ext not in IMAGE_TYPES.get(content_type, ()):
+        raise ValueError("Unsupported upload.")
+    prefix = UPLOAD_TARGETS[purpose][0]
+    return f"{prefix}{uuid.uuid4().hex}{ext}"
+
+
+def presign_upload(user, purpose, filename, content_type):
+    """
+    The presigned POST ("url", "fields") for one image plus the "token" the
+    browser sends back with the form once the upload has finished.
+    """
+    key = new_key(purpose, filename, content_type)
+    post = get_backend().presign(
+        key,
+        content_type,
+        max_size=settings.IMAGE_UPLOAD_MAX_BYTES,
+        expires=settings.DIRECT_UPLOAD_EXPIRES,
+    )
+    token = signing.dumps(
+        {"key": key, "purpose": purpose, "user": user.pk}, salt=TOKEN_SALT
+    )
+    return {"url": post["url"], "fields": post["fields"], "token": token}
+
+
+def claim_uploads(request, purpose, field):
+    """
+    The storage keys of the uploads whose tokens were posted in `field`.
+    Raises SuspiciousOperation (a 400) for a token that was forged, expired,
+    issued to someone else or for another purpose, names a file that never
+    arrived, was already claimed or breaks the mysite.images limits. Images
+    over the maximum side are scaled down in the background after commit.
+    """
+    keys = []
+    for token in request.POST.getlist(field):
+        try:
+            claim = signing.loads(
+                token,
+                salt=TOKEN_SALT,
+                # Room for the form to be submitted after the upload finishes.
+                max_age=settings.DIRECT_UPLOAD_EXPIRES * 2,
+            )
+        except signing.BadSignature as e:
+            raise SuspiciousOperation("Invalid upload token.") from e
+        if claim["purpose"] != purpose or claim["user"] != request.user.pk:
+            raise SuspiciousOperation("Upload token does not belong to this form.")
+        keys.append(claim["key"])
+    if not keys:
+        return []
+
+    keys = list(dict.fromkeys(keys))
+    backend = get_backend()
+    if not all(backend.exists(key) for key in keys):
+        raise SuspiciousOperation("Upload did not finish.")
+    _, model_label, field_name = UPLOAD_TARGETS[purpose]
+    model = apps.get_model(model_label)
+    if model.objects.filter(**{f"{field_name}__in": keys}).exists():
+        raise SuspiciousOperation("Upload already claimed.")
+    max_side = (
+        settings.AVATAR_MAX_DIMENSION
+        if purpose == "avatar"
+        else settings.IMAGE_MAX_DIMENSION
+    )
+    oversized = [key for key in keys if _check_stored(backend, key) > max_side]
+    if oversized:
+        transaction.on_commit(
+            lambda: background.submit(fit_stored_images, oversized, max_side)
+        )
+    return keys
+
+
+def _check_stored(backend, key):
+    """
+    Apply the mysite.images limits to an upload that never passed through a
+    form, from its header alone. Returns its longer side; a file breaking
+    the limits is deleted and raises SuspiciousOperation.
+    """
+    header = BytesIO(backend.head(key, HEADER_BYTES))
+    try:
+        _, width, height = inspect_image(header, size=backend.size(key))
+    except ValidationError as e:
+        backend.storage.delete(key)
+        raise SuspiciousOperation(e.messages[0]) from e
+    return max(width, height)
+
+
+def fit_stored_images(keys, max_side, storage=None):
+    """
+    Background job: scale the stored files under `keys` down to `max_side`,
+    overwriting each in place so the rows that name them stay valid.
+    """
+    storage = storage or default_storage
+    for key in keys:
+        with storage.open(key) as stored:
+            fitted = fit_image(stored, max_side)
+            if fitted is stored:
+                continue
+        with storage.open(key, "wb") as out:
+            out.write(fitted.read())
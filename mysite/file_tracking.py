@@ -0,0 +1,73 @@
+"""
+Delete replaced and orphaned upload files without extra queries.
+
+FileTrackingMixin remembers the stored name of each tracked file field when
+a row is loaded (from_db), so save() can tell whether the file changed by
+comparing names instead of re-reading the row. Replaced files, and the files
+of deleted rows (delete_tracked_files, wired to post_delete), are tombstoned
+in the same transaction and deleted from storage after it commits (see
+listings.media_gc), so a rollback never leaves a row pointing at a deleted
+file.
+"""
+
+import os
+
+
+def _name(value):
+    return getattr(value, "name", value) or ""
+
+
+def discard_files(names):
+    from listings.media_gc import tombstone
+
+    tombstone(names)
+
+
+class FileTrackingMixin:
+    """
+    Set `tracked_file_fields` to the FileField names to watch and
+    `protected_files` to stored names that are shared defaults and must
+    never be deleted.
+    """
+
+    tracked_file_fields = ()
+    protected_files = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_files()
+        return instance
+
+    def _remember_files(self):
+        # Deferred fields are not in __dict__ and stay unknown (never cleaned).
+        self._original_files = {
+            name: _name(self.__dict__[name])
+            for name in self.tracked_file_fields
+            if name in self.__dict__
+        }
+
+    def _is_protected(self, name):
+        protected = {os.path.basename(path) for path in self.protected_files}
+        return not name or os.path.basename(name) in protected
+
+    def file_changed(self, field_name):
+        original = getattr(self, "_original_files", {}).get(field_name)
+        return original is not None and original != _name(getattr(self, field_name))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        replaced = [
+            self._original_files[field_name]
+            for field_name in self.tracked_file_fields
+            if (update_fields is None or field_name in update_fields)
+            and self.file_changed(field_name)
+        ]
+        discard_files([name for name in replaced if not self._is_protected(name)])
+        self._remember_files()
+
+    def delete_tracked_files(self):
+        """Schedule this row's own files for deletion; call from post_delete."""
+        names = [_name(getattr(self, field_name)) for field_name in self.tracked_file_fields]
+        discard_files([name for name in names if not self._is_protected(name)])
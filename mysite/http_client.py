@@ -0,0 +1,386 @@
+"""
+Shared HTTP client for outbound calls (Hugging Face, Gemini, image fetches).
+
+One keep-alive Session with per-host connection pools, standard timeouts,
+retries with jittered exponential back-off and a per-host circuit breaker.
+Async views use async_request(), which shares the breakers and counters but
+sends through an httpx.AsyncClient so a slow upstream does not hold a worker.
+
+Only idempotent methods are retried on timeouts and RETRY_STATUSES; a POST
+is retried only when the connection could not be made, so it never runs
+twice upstream. Every call, retries included, ends by its deadline, and a
+failed call counts once against the breaker.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# (connect, read) timeout in seconds, used when the caller does not pass one.
+DEFAULT_TIMEOUT = (3.05, 15)
+DEFAULT_RETRIES = 2
+# Whole-call budget in seconds, retries included; under the 30 s router timeout.
+DEFAULT_DEADLINE = 25.0
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Statuses worth retrying; anything else is returned to the caller as-is.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Breaker trips after this many consecutive failures and stays open for RESET_AFTER seconds.
+FAILURE_THRESHOLD = 5
+RESET_AFTER = 30.0
+
+POOL_CONNECTIONS = 10  # number of hosts to keep pools for
+POOL_MAXSIZE = 10  # connections kept alive per host
+# Image and autofill URLs name arbitrary hosts, so only the most recently
+# used ones keep a breaker and counters.
+MAX_TRACKED_HOSTS = 100
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_after=RESET_AFTER):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # While OPEN, opened_at is when the breaker tripped; while
+            # HALF_OPEN, when the probe started. A probe that never reports
+            # back gives up its slot after reset_after.
+            if time.monotonic() - self.opened_at < self.reset_after:
+                return False
+            # Let a single probe through; its outcome decides the next state.
+            self.state = self.HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.total_latency = 0.0
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "short_circuited": self.short_circuited,
+            "avg_latency_ms": round(1000 * self.total_latency / self.requests, 1)
+            if self.requests
+            else 0.0,
+        }
+
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # one AsyncClient per event loop
+_keep_async_clients = False
+_hosts = OrderedDict()  # host -> (CircuitBreaker, HostStats), least recent first
+_registry_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def keep_async_clients():
+    """
+    Reuse one AsyncClient per event loop. Called from mysite/asgi.py: only an
+    ASGI server keeps its loop for the life of the process. Under WSGI every
+    async view gets a fresh loop, so each call opens and closes its own client.
+    """
+    global _keep_async_clients
+    _keep_async_clients = True
+
+
+def _new_async_client():
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=POOL_CONNECTIONS * POOL_MAXSIZE,
+            max_keepalive_connections=POOL_MAXSIZE,
+        ),
+        follow_redirects=True,
+    )
+
+
+def get_async_client():
+    """The pooled AsyncClient of the running loop; the caller's loop owns it."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = _new_async_client()
+    return client
+
+
+@asynccontextmanager
+async def _async_client():
+    if _keep_async_clients:
+        yield get_async_client()
+    else:
+        async with _new_async_client() as client:
+            yield client
+
+
+def _host_state(host):
+    with _registry_lock:
+        state = _hosts.get(host)
+        if state is None:
+            state = _hosts[host] = (CircuitBreaker(), HostStats())
+            if len(_hosts) > MAX_TRACKED_HOSTS:
+                _hosts.popitem(last=False)
+        else:
+            _hosts.move_to_end(host)
+        return state
+
+
+def _count(stats, started=None, error=False, retry=False, short_circuited=False):
+    with _registry_lock:
+        if started is not None:
+            stats.requests += 1
+            stats.total_latency += time.monotonic() - started
+        stats.errors += error
+        stats.retries += retry
+        stats.short_circuited += short_circuited
+
+
+def backoff_delay(attempt):
+    # "Full jitter": a random delay between 0 and the exponential cap.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _retry_after(response):
+    # Only the delay-seconds form; an HTTP-date falls back to plain back-off.
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", "")))
+    except ValueError:
+        return 0.0
+
+
+def _retry_delay(retryable, attempt, retries, deadline, response=None):
+    """Seconds to wait before the next attempt, or None to give up now."""
+    if not retryable or attempt >= retries:
+        return None
+    delay = backoff_delay(attempt)
+    if response is not None:
+        delay = max(delay, _retry_after(response))
+    if time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def _within(timeout, deadline):
+    """`timeout` (a number or a (connect, read) pair) cut to the time left."""
+    remaining = max(0.1, deadline - time.monotonic())
+    if isinstance(timeout, tuple):
+        return tuple(min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+def _is_connect_error(exc):
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(exc, requests.ConnectionError) and isinstance(
+        reason, NewConnectionError
+    )
+
+
+def _open_breaker(breaker, stats, host):
+    if not breaker.allow():
+        _count(stats, short_circuited=True)
+        raise CircuitOpenError(f"Upstream {host} is unavailable, try again later.")
+
+
+def request(method, url, timeout=None, retries=None, deadline=None, **kwargs):
+    """
+    Send a request through the shared session.
+
+    Idempotent methods are retried on connection errors, timeouts and
+    RETRY_STATUSES (honouring Retry-After), other methods only when the
+    connection could not be made, up to `retries` times and never past
+    `deadline` seconds in total. Raises CircuitOpenError without touching the
+    network while the host's breaker is open.
+    """
+    host = urlparse(url).netloc
+    breaker, stats = _host_state(host)
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    retries = DEFAULT_RETRIES if retries is None else retries
+    deadline = time.monotonic() + (DEFAULT_DEADLINE if deadline is None else deadline)
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    _open_breaker(breaker, stats, host)
+
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            response = get_session().request(
+                method, url, timeout=_within(timeout, deadline), **kwargs
+            )
+        except requests.RequestException as e:
+            _count(stats, started, error=True)
+            delay = _retry_delay(
+                idempotent or _is_connect_error(e), attempt, retries, deadline
+            )
+            if delay is None:
+                breaker.record_failure()
+                raise
+        except BaseException:
+            # Anything else (a decode error, an interrupt) still settles the
+            # breaker, or a half-open probe would block the host.
+            _count(stats, started, error=True)
+            breaker.record_failure()
+            raise
+        else:
+            failed = response.status_code in RETRY_STATUSES
+            _count(stats, started, error=failed)
+            if not failed:
+                breaker.record_success()
+                return response
+            delay = _retry_delay(idempotent, attempt, retries, deadline, response)
+            if delay is None:
+                breaker.record_failure()
+                return response
+
+        _count(stats, retry=True)
+        time.sleep(delay)
+        attempt += 1
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def _httpx_timeout(timeout):
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+async def async_request(method, url, timeout=None, retries=None, deadline=None, **kwargs):
+    """
+    Async twin of request(): same retry rules, deadline, breaker and
+    counters, but awaits an httpx response instead of blocking the thread.
+    """
+    host = urlparse(url).netloc
+    breaker, stats = _host_state(host)
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    retries = DEFAULT_RETRIES if retries is None else retries
+    deadline = time.monotonic() + (DEFAULT_DEADLINE if deadline is None else deadline)
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    _open_breaker(breaker, stats, host)
+
+    async with _async_client() as client:
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = await client.request(
+                    method,
+                    url,
+                    timeout=_httpx_timeout(_within(timeout, deadline)),
+                    **kwargs,
+                )
+            except httpx.TransportError as e:
+                _count(stats, started, error=True)
+                connect_error = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                delay = _retry_delay(
+                    idempotent or connect_error, attempt, retries, deadline
+                )
+                if delay is None:
+                    breaker.record_failure()
+                    raise
+            except BaseException:
+                # e.g. TooManyRedirects, a decode error or cancellation.
+                _count(stats, started, error=True)
+                breaker.record_failure()
+                raise
+            else:
+                failed = response.status_code in RETRY_STATUSES
+                _count(stats, started, error=failed)
+                if not failed:
+                    breaker.record_success()
+                    return response
+                delay = _retry_delay(idempotent, attempt, retries, deadline, response)
+                if delay is None:
+                    breaker.record_failure()
+                    return response
+
+            _count(stats, retry=True)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def async_get(url, **kwargs):
+    return await async_request("GET", url, **kwargs)
+
+
+async def async_post(url, **kwargs):
+    return await async_request("POST", url, **kwargs)
+
+
+def upstream_stats():
+    """Per-host counters and breaker state for the hosts still tracked."""
+    with _registry_lock:
+        return {
+            host: dict(stats.as_dict(), circuit=breaker.state)
+            for host, (breaker, stats) in _hosts.items()
+        }
@@ -0,0 +1,92 @@
+"""
+Size limits for uploaded images, checked before anything is decoded.
+
+inspect_image() reads only the header, which gives the byte size, format and
+dimensions. Files over IMAGE_UPLOAD_MAX_BYTES or IMAGE_MAX_PIXELS are rejected
+there, so no worker ever decodes a decompression bomb. fit_image() then
+shrinks originals larger than a maximum side before they are stored. JPEGs
+are decoded at reduced scale (draft mode), so memory per upload is bounded
+by the limits rather than by what the client sent, and at most
+IMAGE_DECODE_CONCURRENCY images are decoded at once per process, however
+many upload threads ask.
+"""
+
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = frozenset({"JPEG", "PNG", "GIF", "WEBP"})
+
+_decode_slots = threading.BoundedSemaphore(settings.IMAGE_DECODE_CONCURRENCY)
+
+
+def inspect_image(file, size=None):
+    """
+    (format, width, height) of `file` from its header, or ValidationError.
+    `size` is the full byte size when `file` holds only the start of it.
+    """
+    size = file.size if size is None else size
+    if size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(
+            f"Images may be at most {filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES)}."
+        )
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            image_format, (width, height) = img.format, img.size
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ValidationError("Upload a valid image.") from e
+    finally:
+        file.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError("Images must be JPEG, PNG, GIF or WebP.")
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f"Images may be at most {settings.IMAGE_MAX_PIXELS / 1_000_000:g} "
+            f"megapixels; this one is {width}x{height}."
+        )
+    return image_format, width, height
+
+
+def fit_image(file, max_side):
+    """
+    `file` itself if it is within max_side on both sides, else a re-encoded
+    copy scaled down to fit. Raises ValidationError like inspect_image().
+    Animated images are kept as they are.
+    """
+    image_format, width, height = inspect_image(file)
+    if max(width, height) <= max_side:
+        return file
+    with _decode_slots, Image.open(file) as img:
+        if getattr(img, "is_animated", False):
+            file.seek(0)
+            return file
+        # thumbnail() picks a JPEG draft scale first, so the full-size
+        # image is never decoded.
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        img = ImageOps.exif_transpose(img)
+        buffer = BytesIO()
+        if image_format == "JPEG":
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(buffer, format="JPEG", quality=85, optimize=True)
+        else:
+            img.save(buffer, format=image_format)
+    file.seek(0)
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def clean_uploaded_image(value, max_side):
+    """
+    For a form's clean_<field>(): fit a newly uploaded file and pass the
+    current file (or a cleared field) through unchanged.
+    """
+    if isinstance(value, UploadedFile):
+        return fit_image(value, max_side)
+    return value
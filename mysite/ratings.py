@@ -0,0 +1,40 @@
+"""
+Helpers for the stored rating aggregates on LoRA and CustomUser.
+
+Both models keep `rating_sum`, `rating_count` and an indexed `rating_score`,
+a Bayesian average that pulls items with few votes toward PRIOR_MEAN so a
+single 5-star vote does not outrank fifty 4-star votes.
+"""
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+PRIOR_MEAN = 3.0  # midpoint of the 1-5 scale
+PRIOR_WEIGHT = 5  # how many "virtual" votes the prior is worth
+
+
+def bayesian_score(rating_sum, rating_count):
+    return (PRIOR_WEIGHT * PRIOR_MEAN + rating_sum) / (PRIOR_WEIGHT + rating_count)
+
+
+def aggregate_update(delta_sum, delta_count, average_field=None):
+    """
+    Keyword arguments for QuerySet.update() that apply a rating delta in one
+    UPDATE. Right-hand F() expressions read the pre-update row, so the new
+    score is computed from old values plus the deltas.
+    """
+    new_sum = Cast(F("rating_sum") + delta_sum, FloatField())
+    new_count = F("rating_count") + delta_count
+    kwargs = {
+        "rating_sum": F("rating_sum") + delta_sum,
+        "rating_count": new_count,
+        "rating_score": (Value(PRIOR_WEIGHT * PRIOR_MEAN) + new_sum)
+        / (Value(float(PRIOR_WEIGHT)) + new_count),
+    }
+    if average_field:
+        kwargs[average_field] = Case(
+            When(rating_count__gt=-delta_count, then=new_sum / new_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    return kwargs
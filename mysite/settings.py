@@ -178,6 +178,51 @@ else:
     }
 
 
+# Cache
+# Shared by the rate limiter and single-flight helpers in mysite/throttling.py.
+# Point CACHE_URL at Redis/Memcached in production so limits hold across workers.
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# Rate limit budgets per scope (mysite.throttling): (calls, period in seconds).
+RATE_LIMITS = {
+    "autofill": (5, 60),
+    "chatbot": (10, 60),
+}
+
+# Proxies in front of the app that append to X-Forwarded-For. Leave at 0 unless
+# one is deployed (set 1 behind Heroku's router); otherwise clients could pick
+# their own rate limit key by sending the header.
+TRUSTED_PROXY_HOPS = env.int("TRUSTED_PROXY_HOPS", default=0)
+
+# Closed loans and requests older than this move to the history tables
+# (manage.py archive_circulation, run daily).
+CIRCULATION_ARCHIVE_AFTER_DAYS = env.int("CIRCULATION_ARCHIVE_AFTER_DAYS", default=30)
+
+# Delete tombstoned media right after commit on a background thread. When off,
+# only the periodic `manage.py sweep_media` deletes them.
+MEDIA_SWEEP_ON_COMMIT = env.bool("MEDIA_SWEEP_ON_COMMIT", default=True)
+
+# Files of one multi-image upload written to storage at once (listings.uploads).
+UPLOAD_WORKERS = env.int("UPLOAD_WORKERS", default=8)
+
+# Browser-to-storage uploads (mysite.direct_uploads). Point the backend at
+# mysite.direct_uploads.LocalUploadBackend to run the flow without S3.
+DIRECT_UPLOAD_BACKEND = env.str(
+    "DIRECT_UPLOAD_BACKEND", default="mysite.direct_uploads.S3PresignedBackend"
+)
+DIRECT_UPLOAD_EXPIRES = 15 * 60
+
+# Limits on uploaded images (mysite.images). Files over the byte or pixel
+# limit are rejected from their header; larger originals are scaled down to
+# the maximum side before they are stored.
+IMAGE_UPLOAD_MAX_BYTES = env.int("IMAGE_UPLOAD_MAX_BYTES", default=10 * 1024 * 1024)
+IMAGE_MAX_PIXELS = env.int("IMAGE_MAX_PIXELS", default=16_000_000)
+IMAGE_MAX_DIMENSION = env.int("IMAGE_MAX_DIMENSION", default=2048)
+AVATAR_MAX_DIMENSION = env.int("AVATAR_MAX_DIMENSION", default=512)
+# Images decoded for resizing at once per process; upload threads queue here.
+IMAGE_DECODE_CONCURRENCY = env.int("IMAGE_DECODE_CONCURRENCY", default=2)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
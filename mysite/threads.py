@@ -0,0 +1,41 @@
+"""
+Materialized-path threading shared by listings.Comment and accounts.UserComment.
+
+Each comment stores `path`, its ancestors' ids and its own, zero-padded and
+"/"-terminated: a reply 45 under comment 12 has path "0000000012/0000000045/".
+A whole subtree is then one indexed prefix query (path__startswith) whatever
+its depth, and ordering by path yields thread order.
+"""
+
+STEP = 11  # ten digits plus the separator
+MAX_DEPTH = 20  # path is a CharField(max_length=255); deeper replies join the last level
+
+
+def path_segment(pk):
+    return f"{pk:010d}/"
+
+
+class ThreadedMixin:
+    """
+    For models with `parent` (FK to self, related_name="replies") and an indexed
+    `path` CharField. The path is written right after the row gets its pk.
+    """
+
+    @property
+    def depth(self):
+        return max(len(self.path) // STEP - 1, 0)
+
+    def save(self, *args, **kwargs):
+        if self.parent_id and self.parent.depth >= MAX_DEPTH - 1:
+            self.parent = self.parent.parent
+        super().save(*args, **kwargs)
+        if not self.path:
+            prefix = self.parent.path if self.parent_id else ""
+            self.path = prefix + path_segment(self.pk)
+            type(self).objects.filter(pk=self.pk).update(path=self.path)
+
+    def descendants(self):
+        if not self.path:
+            # Not saved yet; an empty prefix would match every row.
+            return type(self).objects.none()
+        return type(self).objects.filter(path__startswith=self.path).exclude(pk=self.pk)
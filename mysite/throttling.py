@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+_MISSING = object()
+
+
+def client_ident(request):
+    """
+    Identify the caller: the user id when logged in, otherwise the client IP.
+
+    Proxies append to X-Forwarded-For, so only the last TRUSTED_PROXY_HOPS
+    entries were written by infrastructure we trust; anything before them is
+    whatever the client sent. With no trusted proxies (the default) the
+    header is ignored and REMOTE_ADDR is used.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    hops = getattr(settings, "TRUSTED_PROXY_HOPS", 0)
+    forwarded = [
+        entry.strip()
+        for entry in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+        if entry.strip()
+    ]
+    if hops and len(forwarded) >= hops:
+        return f"ip:{forwarded[-hops]}"
+    return f"ip:{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def take_token(scope, ident, capacity, period, lock_wait=0.25):
+    """
+    Take one token from the (scope, ident) bucket, which holds up to
+    `capacity` tokens and refills at capacity/period tokens per second.
+    Returns (allowed, retry_after_seconds).
+
+    The bucket is stored as (tokens, timestamp). Each update holds a short
+    cache.add() lock on the bucket so concurrent requests cannot spend the
+    same token; a caller that cannot get the lock within `lock_wait` seconds
+    is rejected. The limit only holds across workers when CACHE_URL points
+    at a shared cache (Redis/Memcached).
+    """
+    key = f"throttle:{scope}:{ident}"
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + lock_wait
+    while not cache.add(lock_key, 1, timeout=5):
+        if time.monotonic() >= deadline:
+            return False, 1
+        time.sleep(0.01)
+    try:
+        now = time.time()
+        tokens, stamp = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * capacity / period)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # An untouched bucket is full again after `period`, so let it expire.
+        cache.set(key, (tokens, now), timeout=period)
+    finally:
+        cache.delete(lock_key)
+    if allowed:
+        return True, 0
+    return False, max(1, math.ceil((1 - tokens) * period / capacity))
+
+
+def _too_many_requests(retry_after):
+    response = JsonResponse(
+        {"error": "Too many requests. Please try again shortly."}, status=429
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def _check(scope, request):
+    capacity, period = settings.RATE_LIMITS[scope]
+    return take_token(scope, client_ident(request), capacity, period)
+
+
+def rate_limit(scope):
+    """
+    Rate limit a view per user/IP. Rejected calls get a 429 JSON response
+    with a Retry-After header so the client knows when to try again.
+    Budgets come from settings.RATE_LIMITS.
+    Works on both sync and async views.
+    """
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def _async_wrapped(request, *args, **kwargs):
+                # client_ident may hit the session/user tables, so run it off the loop.
+                allowed, retry_after = await sync_to_async(_check)(scope, request)
+                if not allowed:
+                    return _too_many_requests(retry_after)
+                return await view_func(request, *args, **kwargs)
+
+            return _async_wrapped
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            allowed, retry_after = _check(scope, request)
+            if not allowed:
+                return _too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+
+        return _wrapped
+
+    return decorator
+
+
+def flight_key(*parts):
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def single_flight(key, func, timeout=45, result_ttl=10, poll_interval=0.2):
+    """
+    Run func() once for every caller asking for the same key at the same time.
+
+    The first caller takes a lock in the cache and does the work; concurrent
+    callers wait for its result instead of repeating the upstream calls.
+    If the leader dies without publishing a result, waiters run func() themselves.
+    """
+    lock_key = f"singleflight:lock:{key}"
+    result_key = f"singleflight:result:{key}"
+
+    if cache.add(lock_key, 1, timeout=timeout):
+        try:
+            result = func()
+            cache.set(result_key, result, timeout=result_ttl)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = cache.get(result_key, _MISSING)
+        if result is not _MISSING:
+            return result
+        if cache.get(lock_key) is None:
+            # Leader finished without a result (e.g. it raised); check once more.
+            result = cache.get(result_key, _MISSING)
+            if result is not _MISSING:
+                return result
+            break
+        time.sleep(poll_interval)
+    return func()
+
+
+_inflight = {}  # (event loop id, key) -> asyncio.Task
+
+
+async def _async_flight(key, coro_func, timeout, result_ttl, poll_interval):
+    lock_key = f"singleflight:lock:{key}"
+    result_key = f"singleflight:result:{key}"
+
+    if await cache.aadd(lock_key, 1, timeout=timeout):
+        try:
+            result = await coro_func()
+            await cache.aset(result_key, result, timeout=result_ttl)
+            return result
+        finally:
+            await cache.adelete(lock_key)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = await cache.aget(result_key, _MISSING)
+        if result is not _MISSING:
+            return result
+        if await cache.aget(lock_key) is None:
+            result = await cache.aget(result_key, _MISSING)
+            if result is not _MISSING:
+                return result
+            break
+        await asyncio.sleep(poll_interval)
+    return await coro_func()
+
+
+async def async_single_flight(
+    key, coro_func, timeout=45, result_ttl=10, poll_interval=0.2
+):
+    """
+    Async single_flight(). Callers on the same event loop share one task
+    directly; other processes coordinate through the same cache lock.
+    """
+    loop = asyncio.get_running_loop()
+    local_key = (id(loop), key)
+    task = _inflight.get(local_key)
+    if task is None:
+        task = loop.create_task(
+            _async_flight(key, coro_func, timeout, result_ttl, poll_interval)
+        )
+        _inflight[local_key] = task
+        task.add_done_callback(lambda _: _inflight.pop(local_key, None))
+    # Shield so one client disconnecting does not cancel the shared fetch.
+    return await asyncio.shield(task)
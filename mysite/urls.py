@@ -43,5 +43,8 @@ urlpatterns = [
     path("chatbot/", chatbot_response, name="chatbot_response"),
     path("accounts/settings/", account_settings_view, name="account_settings"),
     path("chatbot_gemini/", chatbot_gemini, name="chatbot_gemini"),
+    path("upstream-stats/", upstream_stats, name="upstream_stats"),
+    path("uploads/sign/", sign_upload, name="sign_upload"),
+    path("uploads/local/", direct_upload_local, name="direct_upload_local"),
 ]
 
@@ -0,0 +1,72 @@
+"""
+Optimistic concurrency for models with a `version` column.
+
+Every UPDATE made through save() is a compare-and-swap: it only matches the
+row if `version` still equals what this instance loaded, and bumps it. A
+save from a stale instance raises StaleObjectError instead of silently
+overwriting the newer row. Combined with save(update_fields=[...]) a write
+touches only the columns it means to change.
+
+Counters (views, likes, ratings, card summaries) are updated with F()
+expressions and deliberately leave `version` alone: they commute with any
+edit, so they should not make an edit form stale.
+"""
+
+from django import forms
+from django.db.models import F
+
+
+class StaleObjectError(Exception):
+    """The row changed since this instance was loaded."""
+
+
+class VersionedMixin:
+    """For models with `version = models.PositiveIntegerField(default=0)`."""
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        version_field = self._meta.get_field("version")
+        values = [value for value in values if value[0] is not version_field]
+        values.append((version_field, None, F("version") + 1))
+        if base_qs.filter(pk=pk_val, version=self.version)._update(values):
+            self.version += 1
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise StaleObjectError(
+                f"{self._meta.verbose_name} {pk_val} was changed by someone else."
+            )
+        return False
+
+
+class VersionedFormMixin:
+    """
+    For ModelForms of versioned models. List "version" in Meta.fields: it is
+    rendered hidden, so a submitted edit is checked against the version the
+    user opened. Saving an existing instance writes only the form's fields.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if "version" in self.fields:
+            self.fields["version"].widget = forms.HiddenInput()
+            # Left out of a post, the instance keeps the version it loaded.
+            self.fields["version"].required = False
+
+    def save_instance(self, instance, extra_fields=()):
+        if instance._state.adding:
+            instance.save()
+        else:
+            model_fields = {field.name for field in instance._meta.concrete_fields}
+            instance.save(
+                update_fields=[
+                    name
+                    for name in (*self.fields, *extra_fields)
+                    if name in model_fields
+                ]
+            )
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if commit:
+            self.save_instance(instance)
+            self.save_m2m()
+        return instance
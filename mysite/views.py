@@ -1,17 +1,23 @@
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousOperation
+from django.http import HttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.contrib import messages
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from listings.models import LoRA, LoRAImage, Model, Comment, LoRARating
 import os
 
+from .direct_uploads import LocalUploadBackend, get_backend, presign_upload
+
 @login_required
 def choose_role(request):
     if request.method == "POST":
         role = request.POST.get("role")
         if role in ["patron", "librarian"]:
             request.user.role = role
-            request.user.save()
+            request.user.save(update_fields=["role"])
             return redirect("dashboard")
         # If role is not valid, simply reload the form.
         return redirect("choose_role")
@@ -50,7 +56,7 @@ def switch_roles(request):
 def switch_role_librarian(request):
     # Update the user's role to 'librarian'
     request.user.role = 'librarian'
-    request.user.save()
+    request.user.save(update_fields=["role"])
     messages.success(request, "Your role has been switched to Librarian.")
     return redirect('account_settings')
 
@@ -59,7 +65,7 @@ def switch_role_librarian(request):
 def switch_role_patron(request):
     # Update the user's role to 'patron'
     request.user.role = 'patron'
-    request.user.save()
+    request.user.save(update_fields=["role"])
     messages.success(request, "Your role has been switched to Patron.")
     return redirect('account_settings')
 
@@ -72,19 +78,22 @@ def notifications_page(request):
     }
     return render(request, "notifications_page.html", context)
 
-import requests
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
 from django.conf import settings
 import json
 
+from . import http_client
+from .throttling import rate_limit
+
 MODEL_URL = "https://api-inference.huggingface.co/models/google/flan-t5-large"
 HEADERS = {
     "Authorization": f"Bearer {settings.HF_API_TOKEN}"
 }
 
-@csrf_exempt
-def chatbot_response(request):
+@rate_limit("chatbot")
+async def chatbot_response(request):
     if request.method == "POST":
         data = json.loads(request.body)
         user_message = data.get("message", "")
@@ -94,7 +103,7 @@ def chatbot_response(request):
         }
 
         try:
-            res = requests.post(MODEL_URL, headers=HEADERS, json=payload)
+            res = await http_client.async_post(MODEL_URL, headers=HEADERS, json=payload, timeout=(3.05, 30))
             res_json = res.json()
 
             if isinstance(res_json, list) and res_json and "generated_text" in res_json[0]:
@@ -112,8 +121,79 @@ def chatbot_response(request):
 
     return JsonResponse({"error": "Invalid request"}, status=400)
 
-@csrf_exempt
-def chatbot_gemini(request):
+def build_gemini_prompt(request, data):
+    """
+    Compose the Gemini prompt: rules, a sample of app data and the user's message.
+    Runs ORM queries, so async callers must wrap it in sync_to_async.
+    """
+    user_message = data.get("message", "")
+
+    # Get counts and sample titles
+    lora_count = LoRA.objects.count()
+    model_count = Model.objects.count()
+    lora_titles = list(LoRA.objects.values_list('title', flat=True)[:5])
+    model_titles = list(Model.objects.values_list('title', flat=True)[:5])
+
+    # Extra context: include up to 10 items/models with URLs and descriptions
+    item_context = ""
+    for lora in LoRA.objects.all()[:10]:
+        full_url = f"{request.scheme}://{request.get_host()}/listings/lora/{lora.id}/"
+        item_context += f"- {lora.title} (ID: {lora.id}, URL: {full_url}, Desc: {lora.description[:60]}...)\n"
+
+    model_context = ""
+    for model in Model.objects.all()[:10]:
+        full_url = f"{request.scheme}://{request.get_host()}/listings/model/{model.id}/"
+        model_context += f"- {model.title} (ID: {model.id}, URL: {full_url}, Desc: {model.description[:60]}...)\n"
+
+    extra_context = (
+        f"Sample items:\n{item_context}\n"
+        f"Sample models/collections:\n{model_context}\n"
+        "You can suggest these items or models to users by name or the full URL."
+    )
+
+    # User info
+    if request.user.is_authenticated:
+        user_info = (
+            f"Username: {request.user.username}, "
+            f"Role: {getattr(request.user, 'role', 'unknown')}, "
+            f"Email: {request.user.email}"
+        )
+    else:
+        user_info = "Anonymous user"
+
+    # Get current context from the conversation (if any)
+    conversation_context = data.get("context", "")
+
+    # Rules and requirements (summarized for context)
+    rules = (
+        "You are an assistant for the LoRA Market web app, a class project CLA system. "
+        "Models are equivalent to collections and LoRAs are equivalent to items. "
+        "There are four user types: Anonymous, Patron, Librarian, and Django Administrator. "
+        "Anonymous users can browse public items and collections but cannot borrow, rate, or comment. "
+        "Patrons can log in with Google, request to borrow items, create public collections, and request access to private collections. "
+        "Librarians can add/edit/delete items and collections, approve/deny borrow requests, and upgrade patrons. "
+        "Django Administrators only access the admin page. "
+        "All uploads are stored on Amazon S3. "
+        "Do not share personal information. Only answer questions related to the app, its listings, models, and usage. "
+        "If you don't know the answer, say so. Always adhere to these rules."
+    )
+
+    # Compose system/context prompt
+    context_prompt = (
+        f"{rules}\n\n"
+        f"App data:\n"
+        f"- {lora_count} LoRA items (e.g., {', '.join(lora_titles)})\n"
+        f"- {model_count} Models/Collections (e.g., {', '.join(model_titles)})\n"
+        f"{extra_context}\n"
+        f"User info: {user_info}\n"
+        f"Conversation context: {conversation_context}\n"
+        f"User message: {user_message}"
+    )
+    return context_prompt
+
+
+@rate_limit("chatbot")
+async def chatbot_gemini(request):
     """
     Chatbot view using Google Gemini API.
     Expects POST with JSON: {"message": "..."}
@@ -122,70 +202,8 @@ def chatbot_gemini(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            user_message = data.get("message", "")
             api_key = os.environ.get("GEMINI_API_KEY")
-
-            # Get counts and sample titles
-            lora_count = LoRA.objects.count()
-            model_count = Model.objects.count()
-            lora_titles = list(LoRA.objects.values_list('title', flat=True)[:5])
-            model_titles = list(Model.objects.values_list('title', flat=True)[:5])
-
-            # Extra context: include up to 10 items/models with URLs and descriptions
-            item_context = ""
-            for lora in LoRA.objects.all()[:10]:
-                full_url = f"{request.scheme}://{request.get_host()}/listings/lora/{lora.id}/"
-                item_context += f"- {lora.title} (ID: {lora.id}, URL: {full_url}, Desc: {lora.description[:60]}...)\n"
-
-            model_context = ""
-            for model in Model.objects.all()[:10]:
-                full_url = f"{request.scheme}://{request.get_host()}/listings/model/{model.id}/"
-                model_context += f"- {model.title} (ID: {model.id}, URL: {full_url}, Desc: {model.description[:60]}...)\n"
-
-            extra_context = (
-                f"Sample items:\n{item_context}\n"
-                f"Sample models/collections:\n{model_context}\n"
-                "You can suggest these items or models to users by name or the full URL."
-            )
-
-            # User info
-            if request.user.is_authenticated:
-                user_info = (
-                    f"Username: {request.user.username}, "
-                    f"Role: {getattr(request.user, 'role', 'unknown')}, "
-                    f"Email: {request.user.email}"
-                )
-            else:
-                user_info = "Anonymous user"
-
-            # Get current context from the conversation (if any)
-            conversation_context = data.get("context", "")
-
-            # Rules and requirements (summarized for context)
-            rules = (
-                "You are an assistant for the LoRA Market web app, a class project CLA system. "
-                "Models are equivalent to collections and LoRAs are equivalent to items. "
-                "There are four user types: Anonymous, Patron, Librarian, and Django Administrator. "
-                "Anonymous users can browse public items and collections but cannot borrow, rate, or comment. "
-                "Patrons can log in with Google, request to borrow items, create public collections, and request access to private collections. "
-                "Librarians can add/edit/delete items and collections, approve/deny borrow requests, and upgrade patrons. "
-                "Django Administrators only access the admin page. "
-                "All uploads are stored on Amazon S3. "
-                "Do not share personal information. Only answer questions related to the app, its listings, models, and usage. "
-                "If you don't know the answer, say so. Always adhere to these rules."
-            )
-
-            # Compose system/context prompt
-            context_prompt = (
-                f"{rules}\n\n"
-                f"App data:\n"
-                f"- {lora_count} LoRA items (e.g., {', '.join(lora_titles)})\n"
-                f"- {model_count} Models/Collections (e.g., {', '.join(model_titles)})\n"
-                f"{extra_context}\n"
-                f"User info: {user_info}\n"
-                f"Conversation context: {conversation_context}\n"
-                f"User message: {user_message}"
-            )
+            context_prompt = await sync_to_async(build_gemini_prompt)(request, data)
 
             url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
             headers = {
@@ -197,7 +215,7 @@ def chatbot_gemini(request):
                 ]
             }
             params = {"key": api_key}
-            response = requests.post(url, headers=headers, params=params, json=payload, timeout=15)
+            response = await http_client.async_post(url, headers=headers, params=params, json=payload)
             res_json = response.json()
 
             # Parse Gemini response
@@ -213,7 +231,45 @@ def chatbot_gemini(request):
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Invalid request"}, status=400)
 
+
+# csrf_exempt only learns to wrap coroutine functions in Django 5.0.
+chatbot_response.csrf_exempt = True
+chatbot_gemini.csrf_exempt = True
+
+@staff_member_required
+def upstream_stats(request):
+    """Per-host latency/error counters and circuit state for outbound calls."""
+    return JsonResponse({"upstreams": http_client.upstream_stats()})
+
 # In views.py
 def account_settings_view(request):
     return render(request, 'account/settings.html')
 
+
+@login_required
+@require_POST
+def sign_upload(request):
+    """Presigned POST for one image the browser will upload itself."""
+    try:
+        upload = presign_upload(
+            request.user,
+            request.POST.get("purpose", ""),
+            request.POST.get("filename", ""),
+            request.POST.get("content_type", ""),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(upload)
+
+
+@csrf_exempt  # Authorized by the signed policy, as an S3 POST would be.
+@require_POST
+def direct_upload_local(request):
+    backend = get_backend()
+    if not isinstance(backend, LocalUploadBackend):
+        return HttpResponse(status=404)
+    try:
+        backend.accept(request.POST, request.FILES.get("file"))
+    except SuspiciousOperation as e:
+        return JsonResponse({"error": str(e)}, status=403)
+    return HttpResponse(status=204)
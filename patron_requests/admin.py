@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import ModelAccessRequest, BorrowRequest, BorrowedLoRA
+from .models import (
+    BorrowedLoRA,
+    BorrowedLoRAHistory,
+    BorrowRequest,
+    BorrowRequestHistory,
+    CollectionBorrowRequest,
+    ModelAccessRequest,
+    ModelAccessRequestHistory,
+    Reservation,
+)
 
 @admin.register(ModelAccessRequest)
 class ModelAccessRequestAdmin(admin.ModelAdmin):
@@ -14,9 +23,37 @@ class BorrowRequestAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at')
     search_fields = ('lora__title', 'patron__username')
 
+@admin.register(CollectionBorrowRequest)
+class CollectionBorrowRequestAdmin(admin.ModelAdmin):
+    list_display = ('model', 'patron', 'duration', 'created_at')
+    search_fields = ('model__title', 'patron__username')
+
 @admin.register(BorrowedLoRA)
 class BorrowedLoRAAdmin(admin.ModelAdmin):
     # Align with actual model fields
-    list_display = ('lora', 'patron', 'start_date', 'returned_at')
-    list_filter = ('start_date', 'returned_at')
+    list_display = ('lora', 'patron', 'start_date', 'due_at', 'is_overdue', 'returned_at')
+    list_filter = ('is_overdue', 'start_date', 'returned_at')
+    search_fields = ('lora__title', 'patron__username')
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ('lora', 'patron', 'starts_at', 'ends_at')
+    list_filter = ('starts_at',)
     search_fields = ('lora__title', 'patron__username')
+
+@admin.register(ModelAccessRequestHistory)
+class ModelAccessRequestHistoryAdmin(admin.ModelAdmin):
+    list_display = ('model_title', 'patron_username', 'created_at', 'approved', 'archived_at')
+    list_filter = ('approved',)
+    search_fields = ('model_title', 'patron_username')
+
+@admin.register(BorrowRequestHistory)
+class BorrowRequestHistoryAdmin(admin.ModelAdmin):
+    list_display = ('lora_title', 'patron_username', 'status', 'created_at', 'closed_at')
+    list_filter = ('status',)
+    search_fields = ('lora_title', 'patron_username')
+
+@admin.register(BorrowedLoRAHistory)
+class BorrowedLoRAHistoryAdmin(admin.ModelAdmin):
+    list_display = ('lora_title', 'patron_username', 'start_date', 'returned_at')
+    search_fields = ('lora_title', 'patron_username')
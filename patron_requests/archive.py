@@ -0,0 +1,145 @@
+"""
+Move closed circulation rows out of the live tables.
+
+Returned loans, denied or finished borrow requests and archived model-access
+requests are copied into the *History tables and deleted from the live ones
+in batches, each batch in its own transaction, so locks stay short and a
+long backlog can be drained incrementally.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    BorrowedLoRA,
+    BorrowedLoRAHistory,
+    BorrowRequest,
+    BorrowRequestHistory,
+    ModelAccessRequest,
+    ModelAccessRequestHistory,
+)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def default_cutoff():
+    days = getattr(settings, "CIRCULATION_ARCHIVE_AFTER_DAYS", 30)
+    return timezone.now() - timedelta(days=days)
+
+
+def _username(user):
+    return user.username if user else ""
+
+
+def _loan_history(loan):
+    return BorrowedLoRAHistory(
+        original_id=loan.pk,
+        original_request_id=loan.borrow_request_id,
+        lora_id=loan.lora_id,
+        lora_title=loan.lora.title,
+        patron_id=loan.patron_id,
+        patron_username=_username(loan.patron),
+        start_date=loan.start_date,
+        duration=loan.duration,
+        returned_at=loan.returned_at,
+    )
+
+
+def _borrow_request_history(borrow_request):
+    return BorrowRequestHistory(
+        original_id=borrow_request.pk,
+        lora_id=borrow_request.lora_id,
+        lora_title=borrow_request.lora.title if borrow_request.lora else "",
+        patron_id=borrow_request.patron_id,
+        patron_username=_username(borrow_request.patron),
+        duration=borrow_request.duration,
+        status=borrow_request.status,
+        created_at=borrow_request.created_at,
+        closed_at=borrow_request.updated_at,
+    )
+
+
+def _access_request_history(access_request):
+    return ModelAccessRequestHistory(
+        original_id=access_request.pk,
+        model_id=access_request.model_id,
+        model_title=access_request.model.title,
+        patron_id=access_request.patron_id,
+        patron_username=_username(access_request.patron),
+        created_at=access_request.created_at,
+        approved=access_request.approved,
+    )
+
+
+# (live model, history model, closed-row filter, related fields, row -> history row)
+def _sources(cutoff):
+    return [
+        # Loans first: deleting a BorrowRequest would cascade to its loan.
+        (
+            BorrowedLoRA,
+            BorrowedLoRAHistory,
+            Q(returned_at__isnull=False, returned_at__lt=cutoff),
+            ("lora", "patron"),
+            _loan_history,
+        ),
+        (
+            BorrowRequest,
+            BorrowRequestHistory,
+            Q(updated_at__lt=cutoff)
+            & (
+                Q(status=BorrowRequest.DENIED)
+                | Q(status=BorrowRequest.APPROVED, borrowed_lora__isnull=True)
+            ),
+            ("lora", "patron"),
+            _borrow_request_history,
+        ),
+        (
+            ModelAccessRequest,
+            ModelAccessRequestHistory,
+            Q(archived=True, created_at__lt=cutoff),
+            ("model", "patron"),
+            _access_request_history,
+        ),
+    ]
+
+
+def archive_batch(model, history_model, closed, related, to_history, batch_size):
+    """Archive up to batch_size closed rows of `model`. Returns how many moved."""
+    with transaction.atomic():
+        rows = list(
+            model.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(closed)
+            .select_related(*related)
+            .order_by("pk")[:batch_size]
+        )
+        if not rows:
+            return 0
+        history_model.objects.bulk_create(
+            [to_history(row) for row in rows], ignore_conflicts=True
+        )
+        model.objects.filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
+
+
+def archive_closed(cutoff=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Drain every closed row older than `cutoff` into history.
+    Returns {live model name: rows moved}.
+    """
+    cutoff = cutoff or default_cutoff()
+    moved = {}
+    for model, history_model, closed, related, to_history in _sources(cutoff):
+        total = 0
+        while True:
+            count = archive_batch(
+                model, history_model, closed, related, to_history, batch_size
+            )
+            total += count
+            if count < batch_size:
+                break
+        moved[model.__name__] = total
+    return moved
@@ -0,0 +1,248 @@
+"""
+Approve or deny many borrow / model-access requests at once.
+
+The chosen requests are locked and decided in one transaction: statuses go
+out in a single bulk_update, approved loans in one bulk_create and model
+grants in one allowed_users.add() per model. Emails (one SMTP connection via
+send_mass_mail) and in-app notifications (one bulk_create) are sent after
+the transaction commits, so a slow mail server never holds the row locks. A
+mail failure is logged: the decisions are already committed by then.
+
+Each function returns one result per requested id, in input order: a dict
+with request_id, outcome (APPROVED, DENIED or SKIPPED) and detail.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from notifications.models import Notification
+
+from listings.models import LoRA, Model
+
+from .models import BorrowedLoRA, BorrowRequest, ModelAccessRequest
+from .reservations import is_free
+
+APPROVED = "approved"
+DENIED = "denied"
+SKIPPED = "skipped"
+
+logger = logging.getLogger(__name__)
+
+
+def _result(request_id, outcome, detail):
+    return {"request_id": request_id, "outcome": outcome, "detail": detail}
+
+
+class _Outbox:
+    """Emails and notifications collected during a transaction, sent on commit."""
+
+    def __init__(self, actor):
+        self.actor = actor
+        self.emails = []
+        self.notifications = []
+
+    def add(self, recipient, subject, body, verb, target):
+        self.emails.append((subject, body, settings.DEFAULT_FROM_EMAIL, [recipient.email]))
+        self.notifications.append((recipient, verb, target, body))
+
+    def send_on_commit(self):
+        transaction.on_commit(self._send)
+
+    def _send(self):
+        if self.notifications:
+            actor_type = ContentType.objects.get_for_model(self.actor)
+            Notification.objects.bulk_create(
+                Notification(
+                    recipient=recipient,
+                    actor_content_type=actor_type,
+                    actor_object_id=self.actor.pk,
+                    verb=verb,
+                    target_content_type=ContentType.objects.get_for_model(target),
+                    target_object_id=target.pk,
+                    description=description,
+                )
+                for recipient, verb, target, description in self.notifications
+            )
+        if self.emails:
+            try:
+                send_mass_mail(self.emails, fail_silently=False)
+            except Exception:
+                logger.exception("Could not email %d bulk decisions.", len(self.emails))
+
+
+def _parse_ids(request_ids):
+    ids = []
+    for value in request_ids:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    return list(dict.fromkeys(ids))
+
+
+def _in_order(ids, results):
+    return [
+        results.get(pk) or _result(pk, SKIPPED, "Request not found or already handled.")
+        for pk in ids
+    ]
+
+
+def decide_borrow_requests(librarian, request_ids, approve):
+    ids = _parse_ids(request_ids)
+    results = {}
+    outbox = _Outbox(librarian)
+    now = timezone.now()
+
+    with transaction.atomic():
+        pending = list(
+            BorrowRequest.objects.select_for_update(of=("self",))
+            .select_related("lora", "patron")
+            .filter(pk__in=ids, status=BorrowRequest.PENDING)
+            .order_by("created_at", "pk")
+        )
+        decided = []
+        loans = []
+        lent_lora_ids = set()
+
+        if approve:
+            # Lock the LoRAs too, so a concurrent approval cannot lend one twice.
+            available = set(
+                LoRA.objects.select_for_update()
+                .filter(
+                    pk__in=[r.lora_id for r in pending if r.lora_id],
+                    status=LoRA.CHECKED_IN,
+                )
+                .values_list("pk", flat=True)
+            )
+
+        for borrow_request in pending:
+            lora = borrow_request.lora
+            if lora is None:
+                results[borrow_request.pk] = _result(
+                    borrow_request.pk, SKIPPED, "The LoRA no longer exists."
+                )
+                continue
+            if approve and (lora.pk not in available or lora.pk in lent_lora_ids):
+                results[borrow_request.pk] = _result(
+                    borrow_request.pk, SKIPPED, f"'{lora.title}' is not available."
+                )
+                continue
+
+            if approve and not is_free(
+                lora.pk,
+                now,
+                now + borrow_request.duration,
+                ignore_patron=borrow_request.patron,
+            ):
+                results[borrow_request.pk] = _result(
+                    borrow_request.pk, SKIPPED, f"'{lora.title}' is reserved during that time."
+                )
+                continue
+
+            borrow_request.status = (
+                BorrowRequest.APPROVED if approve else BorrowRequest.DENIED
+            )
+            borrow_request.updated_at = now
+            decided.append(borrow_request)
+
+            if approve:
+                lent_lora_ids.add(lora.pk)
+                loans.append(
+                    BorrowedLoRA(
+                        borrow_request=borrow_request,
+                        lora=lora,
+                        patron=borrow_request.patron,
+                        start_date=now,
+                        duration=borrow_request.duration,
+                        # bulk_create skips save(), which normally sets due_at.
+                        due_at=now + borrow_request.duration,
+                    )
+                )
+                results[borrow_request.pk] = _result(
+                    borrow_request.pk, APPROVED, f"'{lora.title}' lent to {borrow_request.patron.username}."
+                )
+                outbox.add(
+                    borrow_request.patron,
+                    "Borrow Request Approved",
+                    f"Your request to borrow '{lora.title}' for {borrow_request.duration} has been approved.",
+                    "approved your borrow request for",
+                    lora,
+                )
+            else:
+                results[borrow_request.pk] = _result(
+                    borrow_request.pk, DENIED, f"Request for '{lora.title}' denied."
+                )
+                outbox.add(
+                    borrow_request.patron,
+                    "Borrow Request Denied",
+                    f"Your request to borrow '{lora.title}' has been denied.",
+                    "denied your borrow request for",
+                    lora,
+                )
+
+        BorrowRequest.objects.bulk_update(decided, ["status", "updated_at"])
+        if loans:
+            BorrowedLoRA.objects.bulk_create(loans)
+            # A status change is an edit: bump version so open edit forms go stale.
+            LoRA.objects.filter(pk__in=lent_lora_ids).update(
+                status=LoRA.IN_CIRCULATION, version=F("version") + 1
+            )
+        outbox.send_on_commit()
+
+    return _in_order(ids, results)
+
+
+def decide_model_requests(librarian, request_ids, approve):
+    ids = _parse_ids(request_ids)
+    results = {}
+    outbox = _Outbox(librarian)
+
+    with transaction.atomic():
+        open_requests = list(
+            ModelAccessRequest.objects.select_for_update(of=("self",))
+            .select_related("model", "patron")
+            .filter(pk__in=ids, approved=False, archived=False)
+        )
+        grants = defaultdict(set)
+        for access_request in open_requests:
+            access_request.approved = approve
+            access_request.archived = True
+            model, patron = access_request.model, access_request.patron
+            if approve:
+                grants[model.pk].add(patron.pk)
+                results[access_request.pk] = _result(
+                    access_request.pk, APPROVED, f"{patron.username} can now open '{model.title}'."
+                )
+                outbox.add(
+                    patron,
+                    "Access Request Approved",
+                    f"Your request for access to model '{model.title}' has been approved.",
+                    "has approved your access to",
+                    model,
+                )
+            else:
+                results[access_request.pk] = _result(
+                    access_request.pk, DENIED, f"Access for {patron.username} to '{model.title}' denied."
+                )
+                outbox.add(
+                    patron,
+                    "Access Request Denied",
+                    f"Your request for access to model '{model.title}' has been denied.",
+                    "has denied your access to",
+                    model,
+                )
+
+        ModelAccessRequest.objects.bulk_update(open_requests, ["approved", "archived"])
+        # One add() per model keeps the allowed_users signals (ACL cache
+        # invalidation) firing.
+        for model in Model.objects.filter(pk__in=grants):
+            model.allowed_users.add(*grants[model.pk])
+        outbox.send_on_commit()
+
+    return _in_order(ids, results)
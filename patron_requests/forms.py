@@ -24,4 +24,25 @@ class BorrowLoRAForm(forms.Form):
                 errors.append("Due date must be in the future.")
         if errors:
             raise forms.ValidationError(errors)
-        return due_date
\ No newline at end of file
+        return due_date
+
+class ReservationForm(forms.Form):
+    starts_at = forms.DateTimeField(
+        label="From",
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}),
+    )
+    ends_at = forms.DateTimeField(
+        label="Until",
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local', 'class': 'form-control'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        starts_at = cleaned_data.get("starts_at")
+        ends_at = cleaned_data.get("ends_at")
+        if starts_at and ends_at:
+            if starts_at <= timezone.now():
+                self.add_error("starts_at", "Reservations must start in the future.")
+            if ends_at <= starts_at:
+                self.add_error("ends_at", "The reservation must end after it starts.")
+        return cleaned_data
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from patron_requests.archive import DEFAULT_BATCH_SIZE, archive_closed, default_cutoff
+
+
+class Command(BaseCommand):
+    help = "Move returned loans and closed borrow/access requests into the history tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Only archive rows closed at least this many days ago "
+            "(default: settings.CIRCULATION_ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["days"] is None:
+            cutoff = default_cutoff()
+        else:
+            cutoff = timezone.now() - timedelta(days=options["days"])
+        moved = archive_closed(cutoff=cutoff, batch_size=options["batch_size"])
+        for name, count in moved.items():
+            self.stdout.write(self.style.SUCCESS(f"Archived {count} {name} rows."))
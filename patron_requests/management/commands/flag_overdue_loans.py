@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from patron_requests.overdue import flag_overdue
+
+
+class Command(BaseCommand):
+    help = "Flag every unreturned loan past its due date as overdue. Run periodically (e.g. from cron)."
+
+    def handle(self, *args, **options):
+        count = flag_overdue()
+        self.stdout.write(self.style.SUCCESS(f"Flagged {count} overdue loans."))
@@ -2,32 +2,33 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.core.mail import send_mail
 from django.conf import settings
-from patron_requests.models import BorrowedItem
+from patron_requests.models import BorrowedLoRA
 
 class Command(BaseCommand):
-    help = "Send reminder emails for borrowed items due within the next 24 hours"
+    help = "Send reminder emails for borrowed LoRAs due within the next 24 hours"
 
     def handle(self, *args, **options):
         now = timezone.now()
         threshold = now + timezone.timedelta(hours=24)
-        due_soon_items = BorrowedItem.objects.filter(due_date__lte=threshold, due_date__gte=now, reminder_sent=False)
+        due_soon_items = BorrowedLoRA.objects.filter(
+            returned_at__isnull=True, due_at__lte=threshold, due_at__gte=now, reminder_sent=False
+        ).select_related("lora", "patron")
         
         for borrowed in due_soon_items:
-            subject = f"Reminder: {borrowed.item.title} is due soon"
+            subject = f"Reminder: {borrowed.lora.title} is due soon"
             message = (
                 f"Dear {borrowed.patron.username},\n\n"
-                f"Your borrowed item '{borrowed.item.title}' is due on {borrowed.due_date.strftime('%Y-%m-%d %H:%M')}. "
+                f"Your borrowed LoRA '{borrowed.lora.title}' is due on {borrowed.due_at.strftime('%Y-%m-%d %H:%M')}. "
                 "Please return it on time.\n\nThank you."
             )
             recipient = [borrowed.patron.email]
             try:
                 send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient)
-                borrowed.reminder_sent = True
-                borrowed.save()
+                BorrowedLoRA.objects.filter(pk=borrowed.pk).update(reminder_sent=True)
                 self.stdout.write(self.style.SUCCESS(
-                    f"Sent reminder for {borrowed.item.title} to {borrowed.patron.email}."
+                    f"Sent reminder for {borrowed.lora.title} to {borrowed.patron.email}."
                 ))
             except Exception as e:
                 self.stdout.write(self.style.ERROR(
-                    f"Failed to send reminder for {borrowed.item.title} to {borrowed.patron.email}: {e}"
+                    f"Failed to send reminder for {borrowed.lora.title} to {borrowed.patron.email}: {e}"
                 ))
\ No newline at end of file
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.20 on 2026-10-19 14:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('listings', '0005_comment_threading'),
+        ('patron_requests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='modelaccessrequest',
+            index=models.Index(condition=models.Q(('approved', False), ('archived', False)), fields=['-created_at'], name='accessreq_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='borrowreq_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedlora',
+            index=models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['patron', '-start_date'], name='loan_active_idx'),
+        ),
+        migrations.CreateModel(
+            name='ModelAccessRequestHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('model_title', models.CharField(max_length=200)),
+                ('patron_username', models.CharField(max_length=150)),
+                ('created_at', models.DateTimeField()),
+                ('approved', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('model', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listings.model')),
+                ('patron', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['patron', '-created_at'], name='accesshist_patron_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BorrowRequestHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('lora_title', models.CharField(max_length=255)),
+                ('patron_username', models.CharField(max_length=150)),
+                ('duration', models.DurationField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('denied', 'Denied')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('lora', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listings.lora')),
+                ('patron', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['patron', '-created_at'], name='borrowhist_patron_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BorrowedLoRAHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('original_request_id', models.BigIntegerField(null=True)),
+                ('lora_title', models.CharField(max_length=255)),
+                ('patron_username', models.CharField(max_length=150)),
+                ('start_date', models.DateTimeField()),
+                ('duration', models.DurationField()),
+                ('returned_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('lora', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='listings.lora')),
+                ('patron', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start_date', '-id'],
+                'indexes': [models.Index(fields=['patron', '-start_date'], name='loanhist_patron_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:05
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_due_at(apps, schema_editor):
+    BorrowedLoRA = apps.get_model("patron_requests", "BorrowedLoRA")
+    BorrowedLoRA.objects.update(due_at=F("start_date") + F("duration"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patron_requests', '0002_circulation_history'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowedlora',
+            name='start_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='borrowedlora',
+            name='due_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='borrowedlora',
+            name='is_overdue',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_due_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='borrowedlora',
+            name='due_at',
+            field=models.DateTimeField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedlora',
+            index=models.Index(fields=['returned_at', 'due_at'], name='loan_due_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.20 on 2026-10-19 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('listings', '0005_comment_threading'),
+        ('patron_requests', '0003_borrowedlora_due_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lora', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='listings.lora')),
+                ('patron', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['starts_at'],
+                'indexes': [models.Index(fields=['lora', 'starts_at'], name='reservation_start_idx'), models.Index(fields=['lora', 'ends_at'], name='reservation_end_idx')],
+                'constraints': [models.CheckConstraint(check=models.Q(('ends_at__gt', models.F('starts_at'))), name='reservation_ends_after_start')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.20 on 2026-10-19 16:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('listings', '0005_comment_threading'),
+        ('patron_requests', '0004_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionBorrowRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duration', models.DurationField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_requests', to='listings.model')),
+                ('patron', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='collection_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='borrowrequest',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='requests', to='patron_requests.collectionborrowrequest'),
+        ),
+    ]
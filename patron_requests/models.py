@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 from listings.models import LoRA
 
@@ -25,6 +26,32 @@ class ModelAccessRequest(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Only open requests are queried from the librarian inbox.
+            models.Index(
+                fields=["-created_at"],
+                name="accessreq_open_idx",
+                condition=models.Q(archived=False, approved=False),
+            ),
+        ]
+
+
+class CollectionBorrowRequest(models.Model):
+    """One patron request to borrow every available LoRA of a Model."""
+
+    model = models.ForeignKey(
+        "listings.Model", on_delete=models.CASCADE, related_name="collection_requests"
+    )
+    patron = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="collection_requests",
+    )
+    duration = models.DurationField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Collection request: {self.patron.username} - {self.model.title}"
 
 
 class BorrowRequest(models.Model):
@@ -40,6 +67,14 @@ class BorrowRequest(models.Model):
     lora = models.ForeignKey(
         LoRA, on_delete=models.CASCADE, related_name="borrow_requests", null=True
     )
+    # Set when the request was made as part of borrowing a whole collection.
+    group = models.ForeignKey(
+        CollectionBorrowRequest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="requests",
+    )
 
     patron = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -57,6 +92,15 @@ class BorrowRequest(models.Model):
         title = self.lora.title if self.lora else "Unknown"
         return f"BorrowRequest: {self.patron.username} - {title} ({self.duration} days) [{self.status}]"
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                name="borrowreq_pending_idx",
+                condition=models.Q(status="pending"),
+            ),
+        ]
+
 
 class BorrowedLoRA(models.Model):
     borrow_request = models.OneToOneField(
@@ -70,10 +114,13 @@ class BorrowedLoRA(models.Model):
         on_delete=models.CASCADE,
         related_name="borrowed_loras",
     )
-    start_date = models.DateTimeField(auto_now_add=True)
+    start_date = models.DateTimeField(default=timezone.now, editable=False)
     duration = models.DurationField(
         help_text="Duration (e.g., '1 day, 2:30:00' for 1 day, 2 hours, and 30 minutes)"
     )
+    # start_date + duration, stored so overdue loans can be filtered in the DB.
+    due_at = models.DateTimeField(editable=False)
+    is_overdue = models.BooleanField(default=False)  # set by flag_overdue_loans
     reminder_sent = models.BooleanField(default=False)
     returned_at = models.DateTimeField(
         null=True, blank=True
@@ -81,7 +128,128 @@ class BorrowedLoRA(models.Model):
 
     @property
     def due_date(self):
-        return self.start_date + self.duration
+        return self.due_at
+
+    def save(self, *args, **kwargs):
+        self.due_at = self.start_date + self.duration
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.lora.title} borrowed by {self.patron.username}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["returned_at", "due_at"], name="loan_due_idx"),
+            models.Index(
+                fields=["patron", "-start_date"],
+                name="loan_active_idx",
+                condition=models.Q(returned_at__isnull=True),
+            ),
+        ]
+
+
+class Reservation(models.Model):
+    """
+    A LoRA booked for [starts_at, ends_at). Reservations of one LoRA never
+    overlap (patron_requests.reservations.reserve checks under a row lock),
+    which keeps conflict checks to a single index seek.
+    """
+
+    lora = models.ForeignKey(
+        LoRA, on_delete=models.CASCADE, related_name="reservations"
+    )
+    patron = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="reservations",
+    )
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.lora.title} reserved by {self.patron.username}"
+
+    class Meta:
+        ordering = ["starts_at"]
+        indexes = [
+            models.Index(fields=["lora", "starts_at"], name="reservation_start_idx"),
+            models.Index(fields=["lora", "ends_at"], name="reservation_end_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(ends_at__gt=models.F("starts_at")),
+                name="reservation_ends_after_start",
+            ),
+        ]
+
+
+# --- Circulation history ---
+# Closed rows are moved here by patron_requests.archive so the live tables only
+# hold what the inboxes and loan pages query. Titles and usernames are copied so
+# history stays readable after the LoRA, model or user is deleted.
+class ModelAccessRequestHistory(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    model = models.ForeignKey(
+        "listings.Model", on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    model_title = models.CharField(max_length=200)
+    patron = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    patron_username = models.CharField(max_length=150)
+    created_at = models.DateTimeField()
+    approved = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["patron", "-created_at"], name="accesshist_patron_idx")
+        ]
+
+
+class BorrowRequestHistory(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    lora = models.ForeignKey(LoRA, on_delete=models.SET_NULL, null=True, related_name="+")
+    lora_title = models.CharField(max_length=255)
+    patron = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    patron_username = models.CharField(max_length=150)
+    duration = models.DurationField()
+    status = models.CharField(max_length=10, choices=BorrowRequest.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    closed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["patron", "-created_at"], name="borrowhist_patron_idx")
+        ]
+
+
+class BorrowedLoRAHistory(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    original_request_id = models.BigIntegerField(null=True)
+    lora = models.ForeignKey(LoRA, on_delete=models.SET_NULL, null=True, related_name="+")
+    lora_title = models.CharField(max_length=255)
+    patron = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    patron_username = models.CharField(max_length=150)
+    start_date = models.DateTimeField()
+    duration = models.DurationField()
+    returned_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def due_date(self):
+        return self.start_date + self.duration
+
+    class Meta:
+        ordering = ["-start_date", "-id"]
+        indexes = [
+            models.Index(fields=["patron", "-start_date"], name="loanhist_patron_idx")
+        ]
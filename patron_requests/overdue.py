@@ -0,0 +1,49 @@
+"""
+Overdue loans, read straight from the stored BorrowedLoRA.due_at.
+
+Both the librarian dashboard and the flag_overdue_loans job use these, so
+"overdue" means the same thing everywhere: not returned and past due_at. The
+(returned_at, due_at) index covers every query here.
+"""
+
+from collections import Counter
+
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import BorrowedLoRA
+
+
+def overdue_loans(now=None):
+    now = now or timezone.now()
+    return BorrowedLoRA.objects.filter(returned_at__isnull=True, due_at__lt=now)
+
+
+def overdue_counts(loans):
+    """
+    Overdue loan counts per patron and per LoRA from one GROUP BY query.
+    Returns (patron counts, LoRA counts), each a list of (name, count),
+    largest first. Rows are grouped by id, so two LoRAs sharing a title
+    are listed separately.
+    """
+    by_patron, by_lora = Counter(), Counter()
+    usernames, titles = {}, {}
+    rows = (
+        loans.order_by()
+        .values("patron_id", "patron__username", "lora_id", "lora__title")
+        .annotate(num=Count("pk"))
+    )
+    for row in rows:
+        by_patron[row["patron_id"]] += row["num"]
+        by_lora[row["lora_id"]] += row["num"]
+        usernames[row["patron_id"]] = row["patron__username"]
+        titles[row["lora_id"]] = row["lora__title"]
+    return (
+        [(usernames[pk], count) for pk, count in by_patron.most_common()],
+        [(titles[pk], count) for pk, count in by_lora.most_common()],
+    )
+
+
+def flag_overdue(now=None):
+    """Mark newly overdue loans in a single UPDATE. Returns how many changed."""
+    return overdue_loans(now).filter(is_overdue=False).update(is_overdue=True)
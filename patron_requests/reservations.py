@@ -0,0 +1,154 @@
+"""
+Future bookings of a LoRA.
+
+Reservations of one LoRA never overlap, so sorted by starts_at they are also
+sorted by ends_at. Whether [start, end) is free then only depends on the last
+reservation starting before `end`: if any booking overlaps the window, that
+one does. is_free() is therefore one seek on the (lora, starts_at) index no
+matter how many bookings a LoRA has, and next_free_slot() walks the
+(lora, ends_at) index forward from the requested time.
+
+For calendar views that already hold a range of bookings in memory,
+IntervalIndex answers the same questions with bisect. It also takes the
+LoRA's loan, which may overlap the borrower's own reservation (approval
+skips it via ignore_patron), so it does not rely on bookings being disjoint.
+"""
+
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from listings.models import LoRA
+
+from .models import BorrowedLoRA, Reservation
+
+
+class ReservationConflict(Exception):
+    pass
+
+
+def _active_loan(lora_id):
+    """(start_date, due_at) of the LoRA's unreturned loan, or None."""
+    return (
+        BorrowedLoRA.objects.filter(lora_id=lora_id, returned_at__isnull=True)
+        .values_list("start_date", "due_at")
+        .first()
+    )
+
+
+def conflicting_reservation(lora_id, start, end, ignore_patron=None):
+    """The reservation overlapping [start, end), or None."""
+    reservations = Reservation.objects.filter(lora_id=lora_id, starts_at__lt=end)
+    if ignore_patron is not None:
+        reservations = reservations.exclude(patron=ignore_patron)
+    last = reservations.order_by("-starts_at").first()
+    if last is not None and last.ends_at > start:
+        return last
+    return None
+
+
+def is_free(lora_id, start, end, ignore_patron=None):
+    """
+    Whether nobody else holds the LoRA during [start, end): no overlapping
+    reservation and no unreturned loan still running at `start`.
+    `ignore_patron` skips that patron's own reservations.
+    """
+    loan = _active_loan(lora_id)
+    if loan is not None and loan[0] < end and loan[1] > start:
+        return False
+    return conflicting_reservation(lora_id, start, end, ignore_patron) is None
+
+
+def next_free_slot(lora_id, duration, after=None):
+    """Earliest start >= `after` (default now) of a free window of `duration`."""
+    candidate = max(after or timezone.now(), timezone.now())
+    loan = _active_loan(lora_id)
+    if loan is not None and loan[1] > candidate:
+        candidate = loan[1]
+    upcoming = (
+        Reservation.objects.filter(lora_id=lora_id, ends_at__gt=candidate)
+        .order_by("ends_at")
+        .values_list("starts_at", "ends_at")
+    )
+    for starts_at, ends_at in upcoming.iterator(chunk_size=200):
+        if starts_at - candidate >= duration:
+            break
+        candidate = max(candidate, ends_at)
+    return candidate
+
+
+def available_loras(loras, start, end, ignore_patron=None):
+    """
+    The checked-in LoRAs of `loras` with no reservation overlapping
+    [start, end), as one query.
+    """
+    clashing = Reservation.objects.filter(
+        lora=OuterRef("pk"), starts_at__lt=end, ends_at__gt=start
+    )
+    if ignore_patron is not None:
+        clashing = clashing.exclude(patron=ignore_patron)
+    return loras.filter(status=LoRA.CHECKED_IN).filter(~Exists(clashing))
+
+
+def reserve(lora, patron, start, end):
+    """
+    Book [start, end) for `patron`. The LoRA row is locked while checking, so
+    two concurrent bookings of the same LoRA cannot both succeed.
+    Raises ReservationConflict if the window is taken.
+    """
+    with transaction.atomic():
+        LoRA.objects.select_for_update().filter(pk=lora.pk).first()
+        if not is_free(lora.pk, start, end):
+            raise ReservationConflict(
+                f"'{lora.title}' is already booked during that time."
+            )
+        return Reservation.objects.create(
+            lora=lora, patron=patron, starts_at=start, ends_at=end
+        )
+
+
+class IntervalIndex:
+    """
+    In-memory index over (starts_at, ends_at, item) bookings, e.g. one month
+    of a LoRA's reservations and its loan loaded for a calendar. Bookings
+    may overlap: alongside the sorted starts it keeps the running maximum of
+    ends, so a backwards scan stops as soon as no earlier booking can reach
+    the window.
+    """
+
+    def __init__(self, intervals):
+        self._intervals = sorted(intervals, key=lambda interval: interval[0])
+        self._starts = [interval[0] for interval in self._intervals]
+        self._max_ends = []
+        for _, ends_at, _ in self._intervals:
+            self._max_ends.append(
+                max(ends_at, self._max_ends[-1]) if self._max_ends else ends_at
+            )
+
+    def overlapping(self, start, end):
+        """Bookings overlapping [start, end), in start order."""
+        found = []
+        i = bisect_left(self._starts, end) - 1
+        while i >= 0 and self._max_ends[i] > start:
+            if self._intervals[i][1] > start:
+                found.append(self._intervals[i])
+            i -= 1
+        return found[::-1]
+
+    def is_free(self, start, end):
+        i = bisect_left(self._starts, end) - 1
+        return i < 0 or self._max_ends[i] <= start
+
+    def free_gaps(self, start, end):
+        """The free (gap_start, gap_end) windows inside [start, end)."""
+        gaps = []
+        cursor = start
+        for starts_at, ends_at, _ in self.overlapping(start, end):
+            if starts_at > cursor:
+                gaps.append((cursor, starts_at))
+            cursor = max(cursor, ends_at)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
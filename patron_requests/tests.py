@@ -0,0 +1,252 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from notifications.models import Notification
+
+from listings.models import LoRA, Model
+
+from .bulk import (
+    APPROVED,
+    DENIED,
+    SKIPPED,
+    decide_borrow_requests,
+    decide_model_requests,
+)
+from .models import BorrowedLoRA, BorrowRequest, ModelAccessRequest
+from .overdue import overdue_counts, overdue_loans
+from .reservations import (
+    IntervalIndex,
+    ReservationConflict,
+    is_free,
+    next_free_slot,
+    reserve,
+)
+
+User = get_user_model()
+
+# Keep tests off S3.
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pw", **extra
+    )
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.patron = make_user("patron")
+        self.lora = LoRA.objects.create(
+            title="Booked", description="desc", location="here", librarian=make_user("lib")
+        )
+        self.t0 = timezone.now() + timedelta(days=1)
+        for day in (0, 2, 3):
+            reserve(
+                self.lora,
+                self.patron,
+                self.t0 + timedelta(days=day),
+                self.t0 + timedelta(days=day + 1),
+            )
+
+    def test_overlap_is_rejected(self):
+        t0, lora_id = self.t0, self.lora.pk
+        self.assertFalse(is_free(lora_id, t0 + timedelta(hours=12), t0 + timedelta(days=2)))
+        self.assertTrue(is_free(lora_id, t0 + timedelta(days=1), t0 + timedelta(days=2)))
+        with self.assertRaises(ReservationConflict):
+            reserve(self.lora, self.patron, t0 + timedelta(days=3, hours=1), t0 + timedelta(days=5))
+
+    def test_next_free_slot_skips_short_gaps(self):
+        self.assertEqual(
+            next_free_slot(self.lora.pk, timedelta(days=1), after=self.t0),
+            self.t0 + timedelta(days=1),
+        )
+        self.assertEqual(
+            next_free_slot(self.lora.pk, timedelta(days=2), after=self.t0),
+            self.t0 + timedelta(days=4),
+        )
+
+    def test_interval_index_matches_database(self):
+        index = IntervalIndex(
+            (r.starts_at, r.ends_at, r.pk) for r in self.lora.reservations.all()
+        )
+        window = (self.t0 + timedelta(hours=12), self.t0 + timedelta(days=2, hours=1))
+        self.assertEqual(len(index.overlapping(*window)), 2)
+        self.assertEqual(index.is_free(*window), is_free(self.lora.pk, *window))
+        self.assertEqual(
+            index.free_gaps(*window),
+            [(self.t0 + timedelta(days=1), self.t0 + timedelta(days=2))],
+        )
+
+    def test_interval_index_sees_past_an_overlapping_loan(self):
+        # A long loan overlaps a short reservation that ends first.
+        t0 = self.t0
+        index = IntervalIndex(
+            [
+                (t0, t0 + timedelta(days=5), "loan"),
+                (t0 + timedelta(days=1), t0 + timedelta(days=2), "reservation"),
+            ]
+        )
+        window = (t0 + timedelta(days=3), t0 + timedelta(days=4))
+        self.assertFalse(index.is_free(*window))
+        self.assertEqual([kind for _, _, kind in index.overlapping(*window)], ["loan"])
+        self.assertEqual(index.free_gaps(*window), [])
+
+    def test_calendar_rejects_bad_ranges(self):
+        self.client.force_login(self.patron)
+        url = reverse("lora_reservations", args=[self.lora.pk])
+        naive = self.client.get(url, {"start": "2026-11-01T00:00"})
+        self.assertEqual(naive.status_code, 200)
+        for params in (
+            {"start": "2026-13-01T00:00"},
+            {"start": "tomorrow"},
+            {"start": "2026-11-02T00:00", "end": "2026-11-01T00:00"},
+            {"start": "2026-11-01T00:00", "end": "2030-11-01T00:00"},
+        ):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+    def test_private_model_loras_are_hidden_from_outsiders(self):
+        model = Model.objects.create(
+            title="secret", creator=make_user("owner"), model_type=Model.PRIVATE
+        )
+        model.loras.add(self.lora)
+        outsider = make_user("outsider")
+        self.client.force_login(outsider)
+        for name in ("reserve_lora", "lora_reservations"):
+            url = reverse(name, args=[self.lora.pk])
+            self.assertEqual(self.client.get(url).status_code, 404, name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            model.allowed_users.add(outsider)
+        for name in ("reserve_lora", "lora_reservations"):
+            url = reverse(name, args=[self.lora.pk])
+            self.assertEqual(self.client.get(url).status_code, 200, name)
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+class OverdueTests(TestCase):
+    def test_loras_sharing_a_title_are_counted_apart(self):
+        librarian, patron = make_user("lib"), make_user("patron")
+        long_ago = timezone.now() - timedelta(days=10)
+        for copies in (2, 1):
+            lora = LoRA.objects.create(title="Same", librarian=librarian)
+            for _ in range(copies):
+                request = BorrowRequest.objects.create(
+                    lora=lora, patron=patron, duration=timedelta(days=1)
+                )
+                loan = BorrowedLoRA(
+                    borrow_request=request,
+                    lora=lora,
+                    patron=patron,
+                    duration=timedelta(days=1),
+                )
+                loan.start_date = long_ago
+                loan.save()
+
+        by_patron, by_lora = overdue_counts(overdue_loans())
+        self.assertEqual(by_patron, [("patron", 3)])
+        self.assertEqual(by_lora, [("Same", 2), ("Same", 1)])
+
+
+@override_settings(STORAGES=LOCAL_STORAGES)
+class BulkDecisionTests(TestCase):
+    def setUp(self):
+        self.librarian = make_user("lib", role="librarian")
+
+    def borrow_requests(self, count):
+        requests = []
+        for _ in range(count):
+            lora = LoRA.objects.create(title="L", librarian=self.librarian)
+            patron = make_user(f"patron{User.objects.count()}")
+            requests.append(
+                BorrowRequest.objects.create(
+                    lora=lora, patron=patron, duration=timedelta(days=1)
+                )
+            )
+        return requests
+
+    def count_queries(self, decide, ids, approve):
+        with CaptureQueriesContext(connection) as ctx:
+            decide(self.librarian, ids, approve=approve)
+        return len(ctx.captured_queries)
+
+    def test_stale_and_duplicate_ids_are_skipped(self):
+        first, second = self.borrow_requests(2)
+        decide_borrow_requests(self.librarian, [second.pk], approve=False)
+
+        results = decide_borrow_requests(
+            self.librarian, [first.pk, first.pk, "x", second.pk, 0], approve=True
+        )
+        self.assertEqual(
+            [(r["request_id"], r["outcome"]) for r in results],
+            [(first.pk, APPROVED), (second.pk, SKIPPED), (0, SKIPPED)],
+        )
+        self.assertEqual(BorrowedLoRA.objects.get().borrow_request, first)
+        self.assertEqual(
+            LoRA.objects.get(pk=first.lora_id).status, LoRA.IN_CIRCULATION
+        )
+
+    def test_denials_take_the_same_queries_for_any_batch(self):
+        baseline = self.count_queries(
+            decide_borrow_requests, [r.pk for r in self.borrow_requests(1)], False
+        )
+        self.assertEqual(
+            self.count_queries(
+                decide_borrow_requests, [r.pk for r in self.borrow_requests(10)], False
+            ),
+            baseline,
+        )
+
+    def test_model_grants_take_the_same_queries_for_any_batch(self):
+        model = Model.objects.create(
+            title="m", creator=self.librarian, model_type=Model.PRIVATE
+        )
+
+        def access_requests(count):
+            return [
+                ModelAccessRequest.objects.create(
+                    model=model, patron=make_user(f"patron{User.objects.count()}")
+                ).pk
+                for _ in range(count)
+            ]
+
+        baseline = self.count_queries(decide_model_requests, access_requests(1), True)
+        ids = access_requests(10)
+        self.assertEqual(self.count_queries(decide_model_requests, ids, True), baseline)
+        self.assertEqual(model.allowed_users.count(), 11)
+
+    def test_mail_goes_out_only_after_commit(self):
+        ids = [r.pk for r in self.borrow_requests(3)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            results = decide_borrow_requests(self.librarian, ids, approve=False)
+        self.assertEqual({r["outcome"] for r in results}, {DENIED})
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(Notification.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_mail_failure_does_not_fail_the_decision(self):
+        ids = [r.pk for r in self.borrow_requests(2)]
+        with mock.patch(
+            "patron_requests.bulk.send_mass_mail", side_effect=OSError("smtp down")
+        ), self.assertLogs("patron_requests.bulk", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                results = decide_borrow_requests(self.librarian, ids, approve=True)
+        self.assertEqual({r["outcome"] for r in results}, {APPROVED})
+        self.assertEqual(Notification.objects.count(), 2)
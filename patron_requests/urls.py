@@ -7,11 +7,20 @@ urlpatterns = [
     # path("librarian/active-borrow-requests/", views.view_active_borrow_requests, name="view_active_borrow_requests"),
     path("librarian/approve-request/<int:request_id>/", views.approve_model_request, name="approve_model_request"),
     path("librarian/deny-request/<int:request_id>/", views.deny_model_request, name="deny_model_request"),
+    path("librarian/bulk-model-requests/", views.bulk_model_requests, name="bulk_model_requests"),
     path('lora/<int:pk>/borrow_page/', views.borrow_lora_page, name='borrow_lora_page'),
     path("librarian/active-borrow-requests/", views.view_active_borrow_requests, name="view_active_borrow_requests"),
     path("librarian/approve-borrow-request/<int:request_id>/", views.approve_borrow_request, name="approve_borrow_request"),
     path("librarian/deny-borrow-request/<int:request_id>/", views.deny_borrow_request, name="deny_borrow_request"),
+    path("librarian/bulk-borrow-requests/", views.bulk_borrow_requests, name="bulk_borrow_requests"),
+    path("model/<int:pk>/borrow/", views.borrow_collection, name="borrow_collection"),
+    path("librarian/borrow-group/<int:pk>/", views.decide_borrow_group, name="decide_borrow_group"),
+    path("lora/<int:pk>/reserve/", views.reserve_lora, name="reserve_lora"),
+    path("lora/<int:pk>/reservations/", views.lora_reservations, name="lora_reservations"),
+    path("reservation/<int:pk>/cancel/", views.cancel_reservation, name="cancel_reservation"),
     path("active-borrowed-loras/", views.view_active_borrowed_loras, name="view_active_borrowed_loras"),
     path("return/<int:pk>/", views.return_borrowed_lora, name="return_borrowed_lora"),
+    path("librarian/overdue-loans/", views.view_overdue_loans, name="view_overdue_loans"),
+    path("history/", views.circulation_history, name="circulation_history"),
     path('promote/', views.promote_patron, name='promote_patron'),
 ]
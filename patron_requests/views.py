@@ -1,20 +1,63 @@
+from datetime import timedelta
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
+from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q
-from django.http import HttpResponseForbidden
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.defaultfilters import pluralize
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
 from notifications.signals import notify
 
 from accounts.models import CustomUser
+from listings.access import accessible_model_ids, can_view
 from listings.models import LoRA, Model
+from mysite.versioning import StaleObjectError
 from patron_requests.forms import BorrowLoRAForm
 from patron_requests.models import BorrowRequest
 
-from .forms import BorrowLoRAForm
-from .models import BorrowedLoRA, BorrowRequest, ModelAccessRequest
+from .bulk import APPROVED, DENIED, decide_borrow_requests, decide_model_requests
+from .forms import BorrowLoRAForm, ReservationForm
+from .models import (
+    BorrowedLoRA,
+    BorrowedLoRAHistory,
+    BorrowRequest,
+    BorrowRequestHistory,
+    CollectionBorrowRequest,
+    ModelAccessRequest,
+    ModelAccessRequestHistory,
+    Reservation,
+)
+from .overdue import overdue_counts, overdue_loans
+from .reservations import (
+    IntervalIndex,
+    ReservationConflict,
+    available_loras,
+    is_free,
+    next_free_slot,
+    reserve,
+)
+
+CALENDAR_DEFAULT_DAYS = 30
+CALENDAR_MAX_DAYS = 366
+HISTORY_PAGE_SIZE = 50
+OVERDUE_PAGE_SIZE = 50
+HISTORY_SOURCES = {
+    "loans": BorrowedLoRAHistory,
+    "borrow": BorrowRequestHistory,
+    "access": ModelAccessRequestHistory,
+}
 
 
 @login_required
@@ -25,10 +68,8 @@ def request_model_access(request, pk):
     # Ensure the model exists.
     model = get_object_or_404(Model, pk=pk)
     # If the model is public or user already has access, redirect.
-    if (
-        not model.is_private
-        or request.user == model.creator
-        or request.user in model.allowed_users.all()
+    if not model.is_private or request.user == model.creator or (
+        model.pk in accessible_model_ids(request.user)
     ):
         messages.info(request, "You already have access to this model.")
         return redirect("model_detail", pk=model.pk)
@@ -81,7 +122,7 @@ def view_active_model_requests(request):
 
     active_model_requests = ModelAccessRequest.objects.filter(
         approved=False, archived=False
-    )
+    ).select_related("model", "patron")
 
     context = {
         "active_model_requests": active_model_requests,
@@ -126,7 +167,8 @@ def approve_model_request(request, request_id):
     access_request.approved = True
     access_request.archived = True
     access_request.save()
-    # Add the patron to the model's allowed_users.
+    # Add the patron to the model's allowed_users. This also drops the patron's
+    # cached set of accessible models (see listings.access).
     access_request.model.allowed_users.add(access_request.patron)
     messages.success(
         request,
@@ -171,6 +213,39 @@ def deny_model_request(request, request_id):
     return redirect("view_active_model_requests")
 
 
+BULK_ACTIONS = {"approve": True, "deny": False}
+
+
+def _bulk_action(request):
+    """True for "approve", False for "deny", None for anything else."""
+    return BULK_ACTIONS.get(request.POST.get("action"))
+
+
+def _report_bulk_results(request, results):
+    levels = {APPROVED: messages.SUCCESS, DENIED: messages.INFO}
+    for result in results:
+        messages.add_message(
+            request, levels.get(result["outcome"], messages.WARNING), result["detail"]
+        )
+
+
+@login_required
+@require_POST
+def bulk_model_requests(request):
+    if request.user.role.strip().lower() != "librarian":
+        return HttpResponseForbidden("You do not have permission to perform this action.")
+    approve = _bulk_action(request)
+    if approve is None:
+        return HttpResponseBadRequest("Unknown action.")
+    results = decide_model_requests(
+        request.user,
+        request.POST.getlist("request_ids"),
+        approve=approve,
+    )
+    _report_bulk_results(request, results)
+    return redirect("view_active_model_requests")
+
+
 @login_required
 def borrow_lora_page(request, pk):
     lora = get_object_or_404(LoRA, pk=pk)
@@ -190,6 +265,16 @@ def borrow_lora_page(request, pk):
                 )
             # Compute an exact duration as a timedelta
             duration = due_date - now
+            if not is_free(lora.pk, now, due_date, ignore_patron=request.user):
+                free_at = next_free_slot(lora.pk, duration)
+                form.add_error(
+                    "due_date",
+                    "This LoRA is reserved during that time. "
+                    f"It is next free for that long from {free_at:%b %d, %Y %H:%M}.",
+                )
+                return render(
+                    request, "borrow_lora_page.html", {"form": form, "lora": lora}
+                )
 
             # Check if a pending borrow request already exists for this lora and user.
             pending_request = BorrowRequest.objects.filter(
@@ -229,15 +314,84 @@ def borrow_lora_page(request, pk):
     return render(request, "borrow_lora_page.html", context)
 
 
+@login_required
+def borrow_collection(request, pk):
+    """Request every currently available LoRA of a Model in one go."""
+    model = get_object_or_404(Model, pk=pk)
+    if not can_view(request.user, model):
+        return redirect("request_model_access", pk=model.pk)
+
+    form = BorrowLoRAForm(request.POST or None)
+    if request.method == "POST" and form.is_valid():
+        now = timezone.now()
+        due_date = form.cleaned_data["due_date"]
+        already_requested = BorrowRequest.objects.filter(
+            patron=request.user, status=BorrowRequest.PENDING
+        ).values("lora_id")
+        loras = list(
+            available_loras(model.loras.all(), now, due_date, ignore_patron=request.user)
+            .exclude(pk__in=already_requested)
+            .only("pk")
+        )
+        if not loras:
+            form.add_error(
+                None, "None of this collection's LoRAs can be borrowed for that period."
+            )
+        else:
+            with transaction.atomic():
+                group = CollectionBorrowRequest.objects.create(
+                    model=model, patron=request.user, duration=due_date - now
+                )
+                BorrowRequest.objects.bulk_create(
+                    BorrowRequest(
+                        lora=lora,
+                        patron=request.user,
+                        duration=group.duration,
+                        status=BorrowRequest.PENDING,
+                        group=group,
+                    )
+                    for lora in loras
+                )
+            messages.success(
+                request,
+                f"Requested {len(loras)} LoRA{pluralize(len(loras))} from '{model.title}'. "
+                "A librarian will review them together.",
+            )
+            return redirect("model_detail", pk=model.pk)
+
+    context = {"form": form, "model": model}
+    return render(request, "borrow_collection_page.html", context)
+
+
+@login_required
+@require_POST
+def decide_borrow_group(request, pk):
+    if request.user.role.strip().lower() != "librarian":
+        return HttpResponseForbidden("Only librarians can approve or deny borrow requests.")
+    approve = _bulk_action(request)
+    if approve is None:
+        return HttpResponseBadRequest("Unknown action.")
+    group = get_object_or_404(CollectionBorrowRequest, pk=pk)
+    results = decide_borrow_requests(
+        request.user,
+        group.requests.filter(status=BorrowRequest.PENDING).values_list("pk", flat=True),
+        approve=approve,
+    )
+    _report_bulk_results(request, results)
+    return redirect("view_active_borrow_requests")
+
+
 @login_required
 def view_active_borrow_requests(request):
     # Only librarians can view active borrow requests.
     if request.user.role.strip().lower() != "librarian":
         return HttpResponseForbidden("You do not have permission to view this page.")
 
-    active_borrow_requests = BorrowRequest.objects.filter(
-        status=BorrowRequest.PENDING
-    ).order_by("created_at") 
+    active_borrow_requests = (
+        BorrowRequest.objects.filter(status=BorrowRequest.PENDING)
+        .select_related("lora", "patron", "group__model")
+        .order_by("created_at", "pk")
+    )
     context = {
         "active_borrow_requests": active_borrow_requests,
     }
@@ -250,22 +404,47 @@ def approve_borrow_request(request, request_id):
     if request.user.role.strip().lower() != "librarian":
         return HttpResponseForbidden("Only librarians can approve borrow requests.")
 
-    borrow_request.status = BorrowRequest.APPROVED
-    borrow_request.save()
+    now = timezone.now()
+    if not is_free(
+        borrow_request.lora_id,
+        now,
+        now + borrow_request.duration,
+        ignore_patron=borrow_request.patron,
+    ):
+        messages.error(
+            request,
+            f"'{borrow_request.lora.title}' is reserved or lent during that time.",
+        )
+        return redirect("view_active_borrow_requests")
 
     lora = borrow_request.lora
-    lora.status = LoRA.IN_CIRCULATION
-    lora.save()
-
-    # Create a BorrowedLoRA record under the original requester, not the librarian
-    from .models import BorrowedLoRA
-
-    BorrowedLoRA.objects.create(
-        borrow_request=borrow_request,
-        lora=lora,
-        patron=borrow_request.patron,   # ← use the patron who requested
-        duration=borrow_request.duration,
-    )
+    try:
+        with transaction.atomic():
+            # Only a still-pending request can be approved, so a double click or
+            # a second librarian cannot lend the LoRA twice.
+            approved = BorrowRequest.objects.filter(
+                pk=borrow_request.pk, status=BorrowRequest.PENDING
+            ).update(status=BorrowRequest.APPROVED, updated_at=now)
+            if not approved:
+                messages.info(request, "This borrow request was already handled.")
+                return redirect("view_active_borrow_requests")
+            borrow_request.status = BorrowRequest.APPROVED
+
+            lora.status = LoRA.IN_CIRCULATION
+            lora.save(update_fields=["status"])
+
+            # Create a BorrowedLoRA record under the original requester, not the librarian
+            BorrowedLoRA.objects.create(
+                borrow_request=borrow_request,
+                lora=lora,
+                patron=borrow_request.patron,   # ← use the patron who requested
+                duration=borrow_request.duration,
+            )
+    except StaleObjectError:
+        messages.error(
+            request, f"'{lora.title}' was changed while approving. Please try again."
+        )
+        return redirect("view_active_borrow_requests")
     messages.success(request, f"Borrow request for '{borrow_request.patron}' approved.")
 
     messages.success(request, f"Borrow request for '{lora.title}' approved.")
@@ -321,6 +500,23 @@ def deny_borrow_request(request, request_id):
     return redirect("view_active_borrow_requests")
 
 
+@login_required
+@require_POST
+def bulk_borrow_requests(request):
+    if request.user.role.strip().lower() != "librarian":
+        return HttpResponseForbidden("Only librarians can approve or deny borrow requests.")
+    approve = _bulk_action(request)
+    if approve is None:
+        return HttpResponseBadRequest("Unknown action.")
+    results = decide_borrow_requests(
+        request.user,
+        request.POST.getlist("request_ids"),
+        approve=approve,
+    )
+    _report_bulk_results(request, results)
+    return redirect("view_active_borrow_requests")
+
+
 @login_required
 def view_active_borrowed_loras(request):
     borrowed_loras = BorrowedLoRA.objects.filter(returned_at__isnull=True, patron=request.user).order_by("-start_date")
@@ -362,14 +558,24 @@ def return_borrowed_lora(request, pk):
         messages.info(request, "This LoRA has already been returned.")
         return redirect("view_active_borrowed_loras")
 
-    # Mark the lora as returned (since returned_at is currently None)
-    borrowed_lora.returned_at = timezone.now()
-    borrowed_lora.save()
-
-    # Optionally update the associated lora's status and send a notification
     lora = borrowed_lora.lora
-    lora.status = LoRA.CHECKED_IN  # Adjust if your model differs.
-    lora.save()
+    try:
+        with transaction.atomic():
+            # Mark the lora as returned, unless a concurrent request already did.
+            returned = BorrowedLoRA.objects.filter(
+                pk=borrowed_lora.pk, returned_at__isnull=True
+            ).update(returned_at=timezone.now())
+            if not returned:
+                messages.info(request, "This LoRA has already been returned.")
+                return redirect("view_active_borrowed_loras")
+
+            lora.status = LoRA.CHECKED_IN  # Adjust if your model differs.
+            lora.save(update_fields=["status"])
+    except StaleObjectError:
+        messages.error(
+            request, f"'{lora.title}' was changed while returning it. Please try again."
+        )
+        return redirect("view_active_borrowed_loras")
 
     send_mail(
         "LoRA Returned",
@@ -383,6 +589,154 @@ def return_borrowed_lora(request, pk):
     return redirect("view_active_borrowed_loras")
 
 
+@login_required
+def circulation_history(request):
+    """
+    Archived loans and requests, read from the history tables only.
+    Librarians see everyone's history; patrons see their own.
+    """
+    kind = request.GET.get("kind", "loans")
+    if kind not in HISTORY_SOURCES:
+        kind = "loans"
+    rows = HISTORY_SOURCES[kind].objects.all()
+    if request.user.role.strip().lower() != "librarian":
+        rows = rows.filter(patron=request.user)
+    page = Paginator(rows, HISTORY_PAGE_SIZE).get_page(request.GET.get("page"))
+    return render(request, "circulation_history.html", {"page": page, "kind": kind})
+
+
+def _visible_lora_or_404(user, pk):
+    """
+    The LoRA, or a 404 when it belongs to a private model `user` cannot see.
+    A LoRA in a private model is in no other model.
+    """
+    lora = get_object_or_404(LoRA, pk=pk)
+    if lora.in_private_model:
+        model = lora.models.filter(model_type=Model.PRIVATE).first()
+        if model is not None and not can_view(user, model):
+            raise Http404("No LoRA matches the given query.")
+    return lora
+
+
+@login_required
+def reserve_lora(request, pk):
+    lora = _visible_lora_or_404(request.user, pk)
+    if request.method == "POST":
+        form = ReservationForm(request.POST)
+        if form.is_valid():
+            starts_at = form.cleaned_data["starts_at"]
+            ends_at = form.cleaned_data["ends_at"]
+            try:
+                reserve(lora, request.user, starts_at, ends_at)
+            except ReservationConflict as e:
+                free_at = next_free_slot(lora.pk, ends_at - starts_at, after=starts_at)
+                form.add_error(
+                    None, f"{e} The next free window of that length starts {free_at:%b %d, %Y %H:%M}."
+                )
+            else:
+                messages.success(request, f"'{lora.title}' is reserved for you.")
+                return redirect("reserve_lora", pk=lora.pk)
+    else:
+        form = ReservationForm()
+
+    upcoming = lora.reservations.filter(ends_at__gt=timezone.now()).select_related(
+        "patron"
+    )[:20]
+    context = {"form": form, "lora": lora, "upcoming": upcoming}
+    return render(request, "reserve_lora.html", context)
+
+
+@login_required
+@require_POST
+def cancel_reservation(request, pk):
+    reservation = get_object_or_404(Reservation, pk=pk)
+    if (
+        request.user != reservation.patron
+        and request.user.role.strip().lower() != "librarian"
+    ):
+        return HttpResponseForbidden("You cannot cancel this reservation.")
+    lora_pk = reservation.lora_id
+    reservation.delete()
+    messages.info(request, "Reservation cancelled.")
+    return redirect("reserve_lora", pk=lora_pk)
+
+
+def _calendar_bound(value, default):
+    """An ISO datetime from the query string, aware in the current time zone."""
+    if not value:
+        return default
+    parsed = parse_datetime(value)  # raises ValueError for impossible dates
+    if parsed is None:
+        raise ValueError("Not an ISO datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@login_required
+def lora_reservations(request, pk):
+    """
+    Calendar data for a LoRA: the booked intervals and the free gaps between
+    ?start= and ?end= (ISO datetimes, default the next 30 days, at most
+    CALENDAR_MAX_DAYS apart).
+    """
+    lora = _visible_lora_or_404(request.user, pk)
+    try:
+        start = _calendar_bound(request.GET.get("start"), timezone.now())
+        end = _calendar_bound(
+            request.GET.get("end"), start + timedelta(days=CALENDAR_DEFAULT_DAYS)
+        )
+    except ValueError:
+        return JsonResponse({"error": "start and end must be ISO datetimes."}, status=400)
+    if not start < end <= start + timedelta(days=CALENDAR_MAX_DAYS):
+        return JsonResponse(
+            {"error": f"end must be after start and within {CALENDAR_MAX_DAYS} days."},
+            status=400,
+        )
+    booked = [
+        (r.starts_at, r.ends_at, "reservation")
+        for r in lora.reservations.filter(starts_at__lt=end, ends_at__gt=start)
+    ]
+    loan = BorrowedLoRA.objects.filter(
+        lora=lora, returned_at__isnull=True, due_at__gt=start
+    ).first()
+    if loan is not None:
+        booked.append((loan.start_date, loan.due_at, "loan"))
+    index = IntervalIndex(booked)
+    return JsonResponse(
+        {
+            "booked": [
+                {"start": s.isoformat(), "end": e.isoformat(), "kind": kind}
+                for s, e, kind in index.overlapping(start, end)
+            ],
+            "free": [
+                {"start": s.isoformat(), "end": e.isoformat()}
+                for s, e in index.free_gaps(start, end)
+            ],
+        }
+    )
+
+
+@login_required
+def view_overdue_loans(request):
+    if request.user.role.strip().lower() != "librarian":
+        return HttpResponseForbidden("You do not have permission to view this page.")
+
+    loans = overdue_loans()
+    by_patron, by_lora = overdue_counts(loans)
+    page = Paginator(
+        loans.select_related("lora", "patron").order_by("due_at", "pk"),
+        OVERDUE_PAGE_SIZE,
+    ).get_page(request.GET.get("page"))
+    context = {
+        "page": page,
+        "by_patron": by_patron,
+        "by_lora": by_lora,
+        "total": sum(count for _, count in by_patron),
+    }
+    return render(request, "overdue_loans.html", context)
+
+
 @login_required
 def promote_patron(request):
     if request.user.role.lower() != "librarian":
@@ -401,7 +755,7 @@ def promote_patron(request):
         user_id = request.POST.get("user_id")
         patron = get_object_or_404(CustomUser, pk=user_id, role__iexact="patron")
         patron.role = "librarian"
-        patron.save()
+        patron.save(update_fields=["role"])
         messages.success(
             request, f"User {patron.username} has been promoted to librarian."
         )